@@ -1,7 +1,12 @@
-from flask import Flask, jsonify, request
-import threading
+from flask import Flask, Response, g, jsonify, request
 import logging
+import time
+import events
 import game_manager
+import game_service
+import metrics
+import sys
+import wire
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,9 +16,13 @@ log.setLevel(logging.ERROR) # Reduce Flask's default logging noise
 app = Flask(__name__)
 
 # --- Game State Management ---
-# A lock is crucial to prevent race conditions when multiple requests
-# try to modify the game state simultaneously.
-game_lock = threading.Lock()
+# Every game session has its own lock, so requests for different games never
+# wait on each other. game_lock is the lock of the default session, which the
+# original single-game routes operate on. The routes below only translate
+# HTTP to the operations in game_service, which take the session locks.
+game_lock = game_manager.get_session().lock
+
+DEFAULT_GAME = {'game_id': game_manager.DEFAULT_GAME_ID}
 
 def set_gui_update_callback(callback):
     """Sets the function to call when the game state changes."""
@@ -23,114 +32,335 @@ def trigger_gui_update():
     """Calls the registered GUI update callback if it exists."""
     game_manager.trigger_gui_update()
 
+def _wants_compact():
+    """
+    True if the client asked for the compact encoding, in which every board is an exponent
+    string (see wire.py): with ?format=compact, or by preferring wire.COMPACT_MIMETYPE in Accept.
+    """
+    if request.args.get('format') == 'compact':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', wire.COMPACT_MIMETYPE]) == wire.COMPACT_MIMETYPE
+
+def _jsonify(body):
+    if _wants_compact():
+        response = jsonify(wire.compact_body(body))
+        response.mimetype = wire.COMPACT_MIMETYPE
+    else:
+        response = jsonify(body)
+    response.vary.add('Accept')
+    return response
+
+def _json_params():
+    """
+    Returns the request's JSON body as a dict, {} without a body, or None if the body is
+    not a JSON object, which routes answer with _not_an_object().
+    """
+    params = request.get_json(silent=True)
+    if params is None:
+        return {}
+    return params if isinstance(params, dict) else None
+
+def _not_an_object():
+    return _respond(({"result": "fail", "error": "JSON body must be an object"}, 400))
+
+def _respond(result):
+    """Turns a (body, status_code) pair from game_service into a Flask response, encoded as negotiated."""
+    body, status_code = result
+    if metrics.enabled:
+        with metrics.JSON_SECONDS.time():
+            return _jsonify(body), status_code
+    return _jsonify(body), status_code
+
+# --- Metrics ---
+
+@app.before_request
+def start_request_timer():
+    if metrics.enabled:
+        g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route, request.method)
+        metrics.REQUESTS.inc(route, request.method, str(response.status_code))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request counts and latency histograms in the Prometheus text format, when metrics are enabled."""
+    if not metrics.enabled:
+        return jsonify({"result": "fail", "error": "Metrics are disabled, start the server with --metrics"}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# --- Session Endpoints ---
+
+@app.route('/games', methods=['POST'])
+def create_game():
+    """Creates a new game session. Accepts optional JSON {"game_id", "size", "engine", "seed"}."""
+    params = _json_params()
+    if params is None:
+        return _not_an_object()
+    return _respond(game_service.create_game(
+        game_id=params.get("game_id"),
+        size=params.get("size", 4),
+        engine=params.get("engine", "auto"),
+        seed=params.get("seed")))
+
+@app.route('/games', methods=['GET'])
+def list_games():
+    """Lists the ids of all game sessions."""
+    return _respond(game_service.list_games())
+
+@app.route('/games/<game_id>', methods=['DELETE'])
+def delete_game(game_id):
+    """Deletes a game session. The default game cannot be deleted."""
+    return _respond(game_service.delete_game(game_id))
+
 # --- API Endpoints ---
+# Each route is available for the default game and, under /games/<game_id>, for any session.
 
-@app.route('/status', methods=['GET'])
-def get_status():
-    """Returns the current game status."""
-    with game_lock:
-        status = game_manager.get_instance().get_status()
-    return jsonify(status)
+@app.route('/status', methods=['GET'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/status', methods=['GET'])
+def get_status(game_id):
+    """
+    Returns the current game status from its published snapshot, without waiting on the game lock.
+    The ETag changes with every change of the game, so pollers can send If-None-Match and get a 304.
+    """
+    snapshot, status_code = game_service.get_status_snapshot(game_id)
+    if status_code != 200:
+        return _respond((snapshot, status_code))
+    if _wants_compact():
+        etag, body, mimetype = f"{snapshot.etag}-c", snapshot.compact_body, wire.COMPACT_MIMETYPE
+    else:
+        etag, body, mimetype = snapshot.etag, snapshot.body, 'application/json'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept')
+    return response
 
-@app.route('/move/<direction>', methods=['POST'])
-def move(direction):
+@app.route('/move/<direction>', methods=['POST'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/move/<direction>', methods=['POST'])
+def move(direction, game_id):
     """Attempts to make a move in the specified direction."""
-    valid_directions = ['up', 'down', 'left', 'right']
-    if direction not in valid_directions:
-        return jsonify({"result": "fail", "error": "Invalid direction"}), 400
-
-    result_status = "fail"
-    error_message = None
-    status_code = 200 # Default OK
-
-    with game_lock:
-        game_instance = game_manager.get_instance()
-        if game_instance.game_over:
-            result_status = "fail"
-            error_message = "Game is over"
-            status_code = 400 # Bad request as game is over
-        else:
-            try:
-                moved = game_instance.move(direction)
-                if moved:
-                    result_status = "ok"
-                    # Explicitly trigger GUI update
-                    game_manager.trigger_gui_update()
-                else:
-                    # Check if the game is over *after* the move attempt
-                    if game_instance.game_over:
-                         result_status = "fail"
-                         error_message = "Game over - no more moves possible"
-                         status_code = 400 # Game ended
-                         # Explicitly trigger GUI update to show final state
-                         game_manager.trigger_gui_update()
-                    else:
-                        result_status = "ok"
-                        error_message = "but your move did not change the board"
-            except Exception as e:
-                result_status = "fail"
-                error_message = f"Internal server error: {str(e)}"
-                status_code = 500
-                print(f"Error during move '{direction}': {e}") # Log internal errors
-
-        # Get current game status to include in response
-        current_status = game_instance.get_status()
-    print(f"<{direction}>: {current_status} {result_status} {error_message}")
-    response = {
-        "game_result": result_status,
-        "current_status": current_status
-    }
-    if error_message:
-        response["error"] = error_message
-
-    return jsonify(response), status_code
-
-@app.route('/reset', methods=['POST'])
-def reset_game():
-    """Resets the game to its initial state."""
-    with game_lock:
-        game_manager.reset_instance()
-    return jsonify({"result": "ok", "message": "Game reset successfully"})
-
-@app.route('/try_move/<direction>', methods=['POST'])
-def try_move(direction):
+    return _respond(game_service.move(direction, game_id))
+
+@app.route('/moves', methods=['POST'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/moves', methods=['POST'])
+def moves(game_id):
+    """
+    Applies a sequence of moves under a single lock acquisition.
+    JSON body: {"directions": ["up", "left", ...], "stop_on_game_over": true}.
+    Returns per-step validity and score deltas, plus only the final status.
+    """
+    params = _json_params()
+    if params is None:
+        return _not_an_object()
+    return _respond(game_service.moves(
+        params.get("directions"),
+        stop_on_game_over=params.get("stop_on_game_over", True),
+        game_id=game_id))
+
+@app.route('/reset', methods=['POST'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/reset', methods=['POST'])
+def reset_game(game_id):
+    """Resets the game to its initial state. Accepts optional JSON {"seed", "size"}."""
+    params = _json_params()
+    if params is None:
+        return _not_an_object()
+    return _respond(game_service.reset_game(game_id, seed=params.get("seed"), size=params.get("size")))
+
+@app.route('/undo', methods=['POST'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/undo', methods=['POST'])
+def undo(game_id):
+    """Takes back the last move or restore."""
+    return _respond(game_service.undo(game_id))
+
+@app.route('/redo', methods=['POST'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/redo', methods=['POST'])
+def redo(game_id):
+    """Repeats the last undone move or restore."""
+    return _respond(game_service.redo(game_id))
+
+@app.route('/snapshot', methods=['POST'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/snapshot', methods=['POST'])
+def snapshot(game_id):
+    """Saves the current game state and returns its snapshot id."""
+    return _respond(game_service.snapshot(game_id))
+
+@app.route('/restore/<int:snapshot_id>', methods=['POST'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/restore/<int:snapshot_id>', methods=['POST'])
+def restore(snapshot_id, game_id):
+    """Puts the game back into a saved snapshot."""
+    return _respond(game_service.restore(snapshot_id, game_id))
+
+@app.route('/try_move/<direction>', methods=['POST'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/try_move/<direction>', methods=['POST'])
+def try_move(direction, game_id):
     """Simulates a move in the specified direction without affecting the actual game state."""
-    valid_directions = ['up', 'down', 'left', 'right']
-    if direction not in valid_directions:
-        return jsonify({"result": "fail", "error": "Invalid direction"}), 400
-
-    with game_lock:
-        game_instance = game_manager.get_instance()
-        # Use the try_move method to simulate the move without changing the game state
-        result = game_instance.try_move(direction)
-        
-    response = {
-        "game_result": "ok" if result["valid"] else "fail",
-        "simulated_status": {
-            "board": result["board"],
-            "score": result["score"],
-            "game_over": result["game_over"],
-            "size": game_instance.size
-        }
-    }
-    
-    if not result["valid"]:
-        if result["game_over"]:
-            response["error"] = "Game over - no more moves possible"
-        else:
-            response["error"] = "Move would not change the board"
-    
-    return jsonify(response)
+    return _respond(game_service.try_move(direction, game_id))
+
+@app.route('/try_move_all', methods=['POST'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/try_move_all', methods=['POST'])
+def try_move_all(game_id):
+    """Previews all four directions at once without spawning tiles or affecting the game state."""
+    return _respond(game_service.try_move_all(game_id))
+
+@app.route('/suggest', methods=['GET'], defaults=DEFAULT_GAME)
+@app.route('/games/<game_id>/suggest', methods=['GET'])
+def suggest(game_id):
+    """Runs an expectimax search from the current board and returns the best direction."""
+    try:
+        depth = int(request.args.get('depth', 3))
+        time_limit = request.args.get('time_limit')
+        time_limit = float(time_limit) if time_limit is not None else None
+    except ValueError:
+        return jsonify({"result": "fail", "error": "depth must be an integer and time_limit a number"}), 400
+    return _respond(game_service.suggest(depth, time_limit, game_id))
+
+# --- Event Stream ---
+# Seconds between keep-alive comments on an idle event stream
+EVENT_KEEPALIVE = 15
+
+def _latest_snapshot(game_id):
+    snapshot, status_code = game_service.get_status_snapshot(game_id)
+    return snapshot if status_code == 200 else None
+
+@app.route('/events', methods=['GET'])
+def event_stream():
+    """
+    Streams game changes as server-sent events instead of polling /status.
+    ?game_id=<id> limits the stream to one game and starts it with that game's full board.
+    Each change is a 'delta' event with the changed cells as [row, col, value] and the score delta;
+    a 'board' event carries the full board, and is sent the first time the stream shows a game
+    and whenever it missed a change. Consumers that fall behind are dropped.
+    """
+    game_id = request.args.get('game_id')
+    if game_id is not None:
+        body, status_code = game_service.get_status_snapshot(game_id)
+        if status_code != 200:
+            return jsonify(body), status_code
+
+    # Subscribe before reading the first board, so no change can fall between the two
+    subscriber = events.hub.subscribe(game_id)
+    if subscriber is None:
+        error = "Server is shutting down" if events.hub.closed else "Too many event streams"
+        response = jsonify({"result": "fail", "error": error})
+        response.headers['Retry-After'] = str(EVENT_KEEPALIVE)
+        return response, 503
+    tracker = events.StreamTracker(_latest_snapshot)
+    initial = tracker.board(game_id) if game_id is not None else None
+
+    def generate():
+        try:
+            # Send something at once, so the server flushes the response headers
+            yield events.format_sse(initial) if initial is not None else ": connected\n\n"
+            while not subscriber.dropped:
+                event = subscriber.get(timeout=EVENT_KEEPALIVE)
+                if subscriber.closed:
+                    # The server is stopping; end the stream so its worker thread is freed
+                    return
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                event = tracker.translate(event)
+                if event is not None:
+                    yield events.format_sse(event)
+            # The queue overflowed, so the stream has gaps; the client should reconnect
+            yield events.format_sse({"type": "dropped", "error": "Consumer too slow"})
+        finally:
+            events.hub.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # --- Flask App Runner ---
-def run_api(host='127.0.0.1', port=5000):
-    """Runs the Flask development server."""
-    # Use threaded=True to handle multiple requests, especially important
-    # if GUI updates take time or block.
-    # use_reloader=False is important when running alongside tkinter
-    print(f"Starting Flask API server on http://{host}:{port}")
-    app.run(host=host, port=port, threaded=True, use_reloader=False)
+SERVERS = ('werkzeug', 'waitress')
+
+# The running server, kept so stop_api can shut it down
+_server = None
+
+def run_api(host='127.0.0.1', port=5000, solver_workers=0, server='werkzeug',
+            threads=8, connection_limit=1000, keepalive_timeout=120, shutdown_timeout=5, max_streams=None):
+    """
+    Runs the API server until stop_api is called. Blocks, so it can run in a thread next to the Tk main loop.
+
+    server='werkzeug' is Flask's development server, with one thread per request.
+    server='waitress' is a production WSGI server with a fixed pool of
+    `threads` workers. It stops accepting connections beyond `connection_limit`, which gives
+    backpressure, and closes keep-alive connections idle for `keepalive_timeout` seconds.
+    On shutdown, requests already being handled get `shutdown_timeout` seconds to finish.
+    An /events stream holds a worker for its whole life, so waitress serves at most `max_streams`
+    of them at once (by default half the threads) and answers 503 beyond that.
+
+    solver_workers > 0 makes /suggest search with a pool of that many worker processes.
+    """
+    global _server
+    if server not in SERVERS:
+        raise ValueError(f"Unknown server: {server}")
+    if solver_workers > 0 and game_service.parallel_solver is None:
+        import solver
+        game_service.parallel_solver = solver.ParallelSolver(workers=solver_workers)
+        print(f"Expectimax solver using {solver_workers} worker processes", file=sys.stderr)
+
+    if server == 'waitress':
+        try:
+            from waitress.server import create_server
+        except ImportError:
+            raise RuntimeError("The waitress server needs the waitress package: pip install waitress")
+        events.hub.open(threads // 2 if max_streams is None else max_streams)
+        _server = create_server(app, host=host, port=port, threads=threads,
+                                connection_limit=connection_limit, channel_timeout=keepalive_timeout)
+        _server.shutdown_timeout = shutdown_timeout
+        print(f"Starting waitress API server on http://{host}:{port} with {threads} threads", file=sys.stderr)
+        _server.run()
+    else:
+        events.hub.open(max_streams)
+        from werkzeug.serving import make_server
+        # Use threaded=True to handle multiple requests, especially important
+        # if GUI updates take time or block.
+        _server = make_server(host, port, app, threaded=True)
+        print(f"Starting Flask API server on http://{host}:{port}", file=sys.stderr)
+        _server.serve_forever()
+
+def stop_api():
+    """Stops the running API server and the solver pool, letting in-flight requests finish."""
+    global _server
+    server, _server = _server, None
+    if server is not None:
+        if hasattr(server, 'task_dispatcher'):
+            # waitress: stop accepting, end the event streams, wait for running requests,
+            # then drop idle keep-alive connections. Sockets are closed by thunks run on the
+            # server's loop thread, since closing them under its select() fails, and the
+            # trigger that runs the thunks stays open until the workers have finished.
+            from waitress import wasyncore
+            server.trigger.pull_trigger(lambda: wasyncore.dispatcher.close(server))
+            events.hub.close()
+            server.task_dispatcher.shutdown(cancel_pending=False, timeout=server.shutdown_timeout)
+            server.trigger.pull_trigger(lambda: wasyncore.close_all(server._map))
+        else:
+            events.hub.close()
+            server.shutdown()
+    if game_service.parallel_solver is not None:
+        game_service.parallel_solver.close()
+        game_service.parallel_solver = None
 
 if __name__ == '__main__':
     # This allows running the API standalone for testing
-    run_api()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="2048 game RESTful API")
+    parser.add_argument("--server", choices=SERVERS, default="werkzeug")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--metrics", action="store_true")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+    try:
+        run_api(server=args.server, threads=args.threads)
+    except KeyboardInterrupt:
+        stop_api()
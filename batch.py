@@ -0,0 +1,144 @@
+import numpy as np
+
+# Direction codes used by BatchGame.step; strings are accepted too.
+DIRECTIONS = ('up', 'down', 'left', 'right')
+DIRECTION_CODES = {d: i for i, d in enumerate(DIRECTIONS)}
+
+
+def _slide_left(rows):
+    """
+    Slides and merges a (K, size) array of exponent rows to the left, in place.
+    Returns the per-row score increase as an int64 array.
+    """
+    size = rows.shape[1]
+
+    # Compress: stable sort moves non-zero tiles to the front, keeping their order
+    order = np.argsort(rows == 0, axis=1, kind='stable')
+    rows[:] = np.take_along_axis(rows, order, axis=1)
+
+    # Merge left to right, exactly like GameLogic._merge: within each run of equal
+    # tiles the 1st and 2nd merge, then the 3rd and 4th, and so on. So a tile merges
+    # into its left neighbour when it sits at an odd offset from the start of its run.
+    same = np.zeros(rows.shape, dtype=bool)
+    same[:, 1:] = (rows[:, 1:] == rows[:, :-1]) & (rows[:, 1:] != 0)
+    index = np.arange(size)
+    run_start = np.maximum.accumulate(np.where(same, 0, index), axis=1)
+    second = same & ((index - run_start) % 2 == 1)
+    first = np.zeros(rows.shape, dtype=bool)
+    first[:, :-1] = second[:, 1:]
+
+    rows[first] += 1
+    rows[second] = 0
+    score = np.where(first, np.left_shift(1, rows.astype(np.int64)), 0).sum(axis=1)
+
+    order = np.argsort(rows == 0, axis=1, kind='stable')
+    rows[:] = np.take_along_axis(rows, order, axis=1)
+    return score
+
+
+def _orient(boards, direction):
+    """Returns a view of the boards in which the given direction becomes 'left'."""
+    if direction == 0:  # up
+        return boards.transpose(0, 2, 1)
+    if direction == 1:  # down
+        return boards.transpose(0, 2, 1)[:, :, ::-1]
+    if direction == 2:  # left
+        return boards
+    return boards[:, :, ::-1]  # right
+
+
+def can_move(boards):
+    """Returns a boolean mask of the boards that still have a legal move."""
+    has_empty = (boards == 0).any(axis=(1, 2))
+    horizontal = (boards[:, :, :-1] == boards[:, :, 1:]).any(axis=(1, 2))
+    vertical = (boards[:, :-1, :] == boards[:, 1:, :]).any(axis=(1, 2))
+    return has_empty | horizontal | vertical
+
+
+class BatchGame:
+    """N games of the same size stepped together over one (N, size, size) uint8 exponent array."""
+
+    def __init__(self, n, size=4, seed=None):
+        self.n = n
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((n, size, size), dtype=np.uint8)
+        self.scores = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        # Add two initial tiles to every board
+        everyone = np.ones(n, dtype=bool)
+        self.spawn(everyone)
+        self.spawn(everyone)
+
+    def spawn(self, mask):
+        """
+        Adds a random tile (2 or 4) to an empty cell of every board selected by mask.
+        Boards without empty cells are left untouched. Returns the mask of boards that got a tile.
+        """
+        flat = self.boards.reshape(self.n, -1)
+        empty = flat == 0
+        mask = mask & empty.any(axis=1)
+
+        # Uniform choice among empty cells: the empty cell holding the largest random key
+        keys = np.where(empty, self.rng.random(flat.shape), -1.0)
+        cells = keys.argmax(axis=1)
+
+        # 90% chance of 2, 10% chance of 4
+        exponents = np.where(self.rng.random(self.n) < 0.9, 1, 2).astype(np.uint8)
+
+        idx = np.nonzero(mask)[0]
+        flat[idx, cells[idx]] = exponents[idx]
+        return mask
+
+    def slide(self, directions):
+        """
+        Slides every board in its direction without spawning tiles or touching scores.
+        Returns (new_boards, moved, score_delta).
+        """
+        directions = self._direction_codes(directions)
+        new_boards = self.boards.copy()
+        score_delta = np.zeros(self.n, dtype=np.int64)
+
+        for code in range(len(DIRECTIONS)):
+            idx = np.nonzero(directions == code)[0]
+            if idx.size == 0:
+                continue
+            group = new_boards[idx]
+            oriented = _orient(group, code)
+            rows = oriented.reshape(-1, self.size).copy()
+            row_score = _slide_left(rows)
+            oriented[...] = rows.reshape(oriented.shape)
+            new_boards[idx] = group
+            score_delta[idx] = row_score.reshape(idx.size, self.size).sum(axis=1)
+
+        moved = (new_boards != self.boards).any(axis=(1, 2))
+        return new_boards, moved, score_delta
+
+    def step(self, directions):
+        """
+        Applies one direction per game and spawns a tile on every board that moved.
+        Games that are already over are not changed.
+        Returns (moved, score_delta, game_over) arrays of length N.
+        """
+        new_boards, moved, score_delta = self.slide(directions)
+        moved &= ~self.game_over
+        score_delta[~moved] = 0
+
+        self.boards[moved] = new_boards[moved]
+        self.scores += score_delta
+        self.spawn(moved)
+        self.game_over |= moved & ~can_move(self.boards)
+        return moved, score_delta, self.game_over.copy()
+
+    def values(self):
+        """Returns the boards as tile values instead of exponents."""
+        return np.where(self.boards == 0, 0, np.left_shift(1, self.boards.astype(np.int64)))
+
+    def _direction_codes(self, directions):
+        """Converts a scalar or sequence of directions (names or codes) into an int array of length N."""
+        if isinstance(directions, str):
+            directions = DIRECTION_CODES[directions]
+        directions = np.asarray(directions)
+        if directions.dtype.kind in 'US':
+            directions = np.array([DIRECTION_CODES[str(d)] for d in directions])
+        return np.broadcast_to(directions.astype(np.int64), (self.n,))
@@ -0,0 +1,257 @@
+"""
+Benchmarks for the game engines and the API routes.
+
+    python benchmark.py                         # engines and routes, JSON to stdout
+    python benchmark.py --skip-routes -o out.json
+    python benchmark.py --url http://127.0.0.1:5000 --concurrency 1 8 32
+
+Engine benchmarks play random games and report moves/sec for move() and
+try_move() of every engine, size and seed. Route benchmarks load-test
+/move, /status and /try_move with a pool of client threads, each playing
+its own game session, and report latency percentiles in milliseconds.
+Without --url the API is started in this process on a free port.
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import platform
+import random
+import sys
+import threading
+import time
+
+import game_logic
+from game_logic import DIRECTIONS, GameLogic
+import move_cache
+
+ENGINES = ('list', 'bitboard', 'numpy', 'batch')
+ROUTES = ('move', 'status', 'try_move')
+
+
+def _percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _supports(engine, size):
+    return engine != 'bitboard' or size == 4
+
+
+# --- Engines ---
+
+def bench_engine_op(engine, size, seed, op, moves):
+    """
+    Plays random directions on one engine until `moves` calls to `op` were made,
+    starting a new game whenever one ends. Returns a result dictionary.
+    Games are seeded, so every engine plays the same trajectories for a seed.
+    For try_move, each call is followed by the real move, which is not timed, so
+    every simulated move starts from a new position instead of a cached one.
+    """
+    rng = random.Random(seed)
+    directions = [rng.choice(DIRECTIONS) for _ in range(1024)]
+    # Runs with the same seed play the same positions, so start every run with cold caches
+    move_cache.cache.clear()
+    game_logic.clear_merged_lines()
+    game = GameLogic.create(size=size, engine=engine, seed=seed)
+    games = 1
+
+    if op == 'move':
+        start = time.perf_counter()
+        for i in range(moves):
+            game.move(directions[i & 1023])
+            if game.game_over:
+                game = GameLogic.create(size=size, engine=engine, seed=seed + games)
+                games += 1
+        elapsed = time.perf_counter() - start
+    else:
+        elapsed = 0.0
+        clock = time.perf_counter
+        for i in range(moves):
+            direction = directions[i & 1023]
+            start = clock()
+            game.try_move(direction)
+            elapsed += clock() - start
+            game.move(direction)
+            if game.game_over:
+                game = GameLogic.create(size=size, engine=engine, seed=seed + games)
+                games += 1
+
+    return {
+        "engine": engine, "size": size, "seed": seed, "op": op,
+        "moves": moves, "games": games, "seconds": elapsed,
+        "moves_per_sec": moves / elapsed if elapsed else None
+    }
+
+
+def bench_batch(size, seed, moves, n=1024):
+    """Steps n numpy games at once with random directions; finished games are replaced by fresh ones."""
+    from batch import BatchGame
+    rng = random.Random(seed)
+    game = BatchGame(n, size=size, seed=seed)
+    steps = max(1, moves // n)
+    games = n
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, game_over = game.step([rng.randrange(4) for _ in range(n)])
+        if game_over.all():
+            game = BatchGame(n, size=size, seed=rng.randrange(2 ** 32))
+            games += n
+    elapsed = time.perf_counter() - start
+
+    total = steps * n
+    return {
+        "engine": "batch", "size": size, "seed": seed, "op": "step",
+        "moves": total, "games": games, "seconds": elapsed,
+        "moves_per_sec": total / elapsed if elapsed else None
+    }
+
+
+def run_engine_benchmarks(engines, sizes, seeds, moves):
+    results = []
+    for engine in engines:
+        for size in sizes:
+            if not _supports(engine, size):
+                continue
+            for seed in seeds:
+                if engine == 'batch':
+                    results.append(bench_batch(size, seed, moves))
+                    continue
+                for op in ('move', 'try_move'):
+                    results.append(bench_engine_op(engine, size, seed, op, moves))
+            print(f"engine {engine} size {size} done", file=sys.stderr)
+    return results
+
+
+# --- Routes ---
+
+@contextlib.contextmanager
+def local_api():
+    """Runs the API in this process on a free port and yields its base URL."""
+    from werkzeug.serving import make_server
+    import api
+
+    server = make_server('127.0.0.1', 0, api.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+
+
+def _route_client(base_url, route, requests_per_client, size, latencies, errors):
+    """One client thread: plays its own game session and records the latency of every request."""
+    import requests
+
+    session = requests.Session()
+    rsp = session.post(f"{base_url}/games", json={"size": size})
+    rsp.raise_for_status()
+    game_url = f"{base_url}/games/{rsp.json()['game_id']}"
+    rng = random.Random()
+
+    try:
+        for _ in range(requests_per_client):
+            if route == 'status':
+                method, path = 'GET', '/status'
+            else:
+                method, path = 'POST', f"/{route}/{rng.choice(DIRECTIONS)}"
+
+            start = time.perf_counter()
+            rsp = session.request(method, game_url + path)
+            latencies.append(time.perf_counter() - start)
+
+            if rsp.status_code >= 500:
+                errors.append(rsp.status_code)
+            elif route == 'move' and rsp.json()["current_status"]["game_over"]:
+                session.post(f"{game_url}/reset")
+    finally:
+        session.delete(game_url)
+        session.close()
+
+
+def bench_route(base_url, route, concurrency, requests_per_client, size=4):
+    """Load-tests one route with `concurrency` clients. Latencies are reported in milliseconds."""
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(_route_client, base_url, route, requests_per_client, size, latencies, errors)
+                   for _ in range(concurrency)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    result = {
+        "route": route, "concurrency": concurrency, "requests": len(latencies),
+        "errors": len(errors), "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed else None,
+        "p50_ms": None, "p99_ms": None, "max_ms": None, "mean_ms": None
+    }
+    if latencies:
+        result["p50_ms"] = _percentile(latencies, 50) * 1000
+        result["p99_ms"] = _percentile(latencies, 99) * 1000
+        result["max_ms"] = latencies[-1] * 1000
+        result["mean_ms"] = sum(latencies) / len(latencies) * 1000
+    return result
+
+
+def run_route_benchmarks(base_url, routes, concurrency_levels, requests_per_client):
+    results = []
+    for route in routes:
+        for concurrency in concurrency_levels:
+            results.append(bench_route(base_url, route, concurrency, requests_per_client))
+            print(f"route {route} concurrency {concurrency} done", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="2048 engine and API benchmarks with JSON output")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[3, 4, 5, 6])
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0, 1, 2])
+    parser.add_argument("--moves", type=int, default=20000, help="calls per engine, size, seed and operation")
+    parser.add_argument("--routes", nargs="+", choices=ROUTES, default=list(ROUTES))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per client thread")
+    parser.add_argument("--url", help="benchmark a running API instead of starting one in this process")
+    parser.add_argument("--skip-engines", action="store_true")
+    parser.add_argument("--skip-routes", action="store_true")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "engines": [],
+        "routes": []
+    }
+
+    if not args.skip_engines:
+        report["engines"] = run_engine_benchmarks(args.engines, args.sizes, args.seeds, args.moves)
+
+    if not args.skip_routes:
+        if args.url:
+            report["routes"] = run_route_benchmarks(args.url, args.routes, args.concurrency, args.requests)
+        else:
+            with local_api() as base_url:
+                report["routes"] = run_route_benchmarks(base_url, args.routes, args.concurrency, args.requests)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
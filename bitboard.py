@@ -0,0 +1,330 @@
+from rng import GameRandom
+
+# The 4x4 board is packed into a 64-bit integer of 4-bit tile exponents.
+# Row r occupies bits 16*r .. 16*r+15, and column c of that row is the
+# nibble at bits 4*c within it (column 0 is the least significant nibble).
+# An exponent of 0 is an empty cell, otherwise the tile value is 2**exponent.
+
+SIZE = 4
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15  # 2**15 == 32768, the largest tile a nibble can hold
+
+DIRECTIONS = ('up', 'down', 'left', 'right')
+
+
+def _reverse_row(row):
+    """Reverses the order of the four nibbles in a 16-bit row, or in each row of an integer array."""
+    return ((row & 0xF) << 12) | ((row & 0xF0) << 4) | ((row >> 4) & 0xF0) | (row >> 12)
+
+
+def _build_tables():
+    """
+    Precomputes the left/right slide result and score delta for every 16-bit row,
+    all rows at once through the batch simulator's row kernel.
+    """
+    import numpy as np
+    from batch import _slide_left
+
+    rows = np.arange(65536, dtype=np.int64)
+    shifts = 4 * np.arange(SIZE, dtype=np.int64)
+    cells = ((rows[:, None] >> shifts) & 0xF).astype(np.uint8)
+    # Two 32768 tiles cannot merge: the result would not fit in a nibble.
+    # Giving each of them a distinct placeholder keeps the kernel from merging them.
+    largest = cells == MAX_EXPONENT
+    cells[largest] = (MAX_EXPONENT + 1 + np.nonzero(largest)[1]).astype(np.uint8)
+    row_score = _slide_left(cells)
+    cells[cells > MAX_EXPONENT] = MAX_EXPONENT
+    row_left = (cells.astype(np.int64) << shifts).sum(axis=1)
+
+    # Sliding right is sliding the reversed row left and reversing the result
+    reversed_rows = _reverse_row(rows)
+    row_right = _reverse_row(row_left[reversed_rows])
+
+    return row_left.tolist(), row_right.tolist(), row_score.tolist()
+
+
+ROW_LEFT, ROW_RIGHT, ROW_SCORE = _build_tables()
+
+
+def transpose(state):
+    """Transposes the packed board so that columns become rows."""
+    a1 = state & 0xF0F00F0FF0F00F0F
+    a2 = state & 0x0000F0F00000F0F0
+    a3 = state & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _slide_rows(state, table):
+    """Applies a row table to all four rows, returning (new_state, score_delta)."""
+    r0 = state & ROW_MASK
+    r1 = (state >> 16) & ROW_MASK
+    r2 = (state >> 32) & ROW_MASK
+    r3 = (state >> 48) & ROW_MASK
+    new_state = table[r0] | (table[r1] << 16) | (table[r2] << 32) | (table[r3] << 48)
+    score = ROW_SCORE[r0] + ROW_SCORE[r1] + ROW_SCORE[r2] + ROW_SCORE[r3]
+    return new_state, score
+
+
+def move_state(state, direction):
+    """
+    Slides a packed board in the given direction without spawning a tile.
+    Returns (new_state, score_delta). Raises ValueError for an unknown direction.
+    """
+    if direction == 'left':
+        return _slide_rows(state, ROW_LEFT)
+    if direction == 'right':
+        return _slide_rows(state, ROW_RIGHT)
+    if direction == 'up':
+        new_state, score = _slide_rows(transpose(state), ROW_LEFT)
+        return transpose(new_state), score
+    if direction == 'down':
+        new_state, score = _slide_rows(transpose(state), ROW_RIGHT)
+        return transpose(new_state), score
+    raise ValueError(f"Invalid direction: {direction}")
+
+
+def empty_cells(state):
+    """Returns the nibble indices (4*row + col) of the empty cells."""
+    return [i for i in range(SIZE * SIZE) if (state >> (4 * i)) & 0xF == 0]
+
+
+def count_empty(state):
+    """Returns the number of empty cells on a packed board."""
+    return bin(empty_mask(state)).count("1")
+
+
+def empty_mask(state):
+    """
+    Returns a mask with the top bit of every empty nibble set, computed for all cells at once:
+    adding 7 to the low three bits of a nibble carries into its top bit unless all four are 0.
+    """
+    return ~(((state & 0x7777777777777777) + 0x7777777777777777) | state) & 0x8888888888888888
+
+
+def has_empty_cell(state):
+    """Checks for an empty cell without looking at the cells one by one."""
+    return empty_mask(state) != 0
+
+
+def can_move(state):
+    """Checks if any direction changes the packed board."""
+    if has_empty_cell(state):
+        return True
+    # A full board only changes by merging, and a merge possible to the left is
+    # also possible to the right, one possible up also possible down
+    return _slide_rows(state, ROW_LEFT)[0] != state or _slide_rows(transpose(state), ROW_LEFT)[0] != transpose(state)
+
+
+def spawn_tile(state, rng):
+    """
+    Adds a random tile (2 or 4) to an empty cell of a packed board, drawing from rng.
+    Returns the new state, or the same state if the board is full.
+    """
+    mask = empty_mask(state)
+    if not mask:
+        return state
+    # The k-th empty cell in row-major order, like GameLogic: drop the k lowest empty bits
+    for _ in range(rng.randrange(bin(mask).count("1"))):
+        mask &= mask - 1
+    shift = (mask & -mask).bit_length() - 4
+    # 90% chance of 2, 10% chance of 4
+    return state | (1 if rng.random() < 0.9 else 2) << shift
+
+
+def largest_tile_count(state):
+    """
+    Returns the number of 32768 tiles on a packed board. Two of them cannot merge,
+    since 65536 does not fit a nibble, so such a board needs the list engine.
+    """
+    return bin(state & (state >> 1) & (state >> 2) & (state >> 3) & 0x1111111111111111).count("1")
+
+
+def encode_board(board):
+    """Packs a 4x4 list-of-lists board of tile values into a 64-bit state. Raises ValueError for tiles above 32768."""
+    state = 0
+    for r in range(SIZE):
+        for c in range(SIZE):
+            value = board[r][c]
+            if value:
+                exponent = value.bit_length() - 1
+                if exponent > MAX_EXPONENT:
+                    raise ValueError(f"Bitboard engine only supports tiles up to {1 << MAX_EXPONENT}, got {value}")
+                state |= exponent << (4 * (SIZE * r + c))
+    return state
+
+
+# The tile values of the two cells packed in each byte, low nibble first
+_BYTE_VALUES = tuple((1 << (b & 0xF) if b & 0xF else 0, 1 << (b >> 4) if b >> 4 else 0) for b in range(256))
+
+
+def decode_board(state):
+    """Unpacks a 64-bit state into a 4x4 list-of-lists board of tile values."""
+    values = _BYTE_VALUES
+    return [list(values[(state >> shift) & 0xFF] + values[(state >> (shift + 8)) & 0xFF])
+            for shift in (0, 16, 32, 48)]
+
+
+class BitboardGame:
+    """
+    A 4x4 game backed by a packed 64-bit board and precomputed row tables.
+    Tiles stop at 32768: two of them do not merge (see largest_tile_count).
+    """
+
+    __slots__ = ('size', 'state', 'score', 'game_over', 'rng')
+
+    def __init__(self, size=4, seed=None):
+        if size != SIZE:
+            raise ValueError(f"Bitboard engine only supports size {SIZE}, got {size}")
+        self.size = size
+        self.state = 0
+        self.score = 0
+        self.game_over = False
+        self.rng = GameRandom(seed)
+        # Add two initial tiles
+        self._add_random_tile()
+        self._add_random_tile()
+
+    @classmethod
+    def from_status(cls, status, rng_state=None):
+        """
+        Rebuilds a game from a get_status() dictionary without spawning any tiles.
+        The generator restarts from the status seed unless rng_state is given.
+        """
+        if status["size"] != SIZE:
+            raise ValueError(f"Bitboard engine only supports size {SIZE}, got {status['size']}")
+        game = cls.__new__(cls)
+        game.size = SIZE
+        game.state = encode_board(status["board"])
+        game.score = status["score"]
+        game.game_over = status["game_over"]
+        game.rng = GameRandom(status.get("seed"), rng_state)
+        return game
+
+    @property
+    def seed(self):
+        return self.rng.seed
+
+    @property
+    def board(self):
+        """The board as a list of lists of tile values, like GameLogic.board."""
+        return decode_board(self.state)
+
+    @board.setter
+    def board(self, board):
+        self.state = encode_board(board)
+
+    def get_status(self):
+        """Returns the current state of the game."""
+        return {
+            "board": self.board,
+            "score": self.score,
+            "game_over": self.game_over,
+            "size": self.size,
+            "seed": self.rng.seed
+        }
+
+    def snapshot(self):
+        """Returns the game state as an immutable CompactState, including the random generator."""
+        from compact import CompactState
+        return CompactState.from_bitboard(self.state, self.score, self.game_over, self.rng.seed, self.rng.state)
+
+    def deferred_snapshot(self):
+        """Returns a function that gives the snapshot of the game as it is now, even after later moves."""
+        from compact import CompactState
+        state, score, game_over, seed, rng_state = self.state, self.score, self.game_over, self.rng.seed, self.rng.state
+        return lambda: CompactState.from_bitboard(state, score, game_over, seed, rng_state)
+
+    def restore(self, state):
+        """Puts the game back into a CompactState taken from a game of the same size."""
+        if state.size != self.size:
+            raise ValueError(f"Snapshot is for size {state.size}, not {self.size}")
+        self.state = state.bitboard()
+        self.score = state.score
+        self.game_over = state.game_over
+        self.rng = GameRandom(state.seed, state.rng_state)
+
+    def _add_random_tile(self):
+        """Adds a random tile (2 or 4) to an empty cell."""
+        state = spawn_tile(self.state, self.rng)
+        if state == self.state:
+            return False # No space left
+        self.state = state
+        return True
+
+    def _can_move(self):
+        """Checks if any moves are possible."""
+        return can_move(self.state)
+
+    def move(self, direction):
+        """
+        Performs a move in the specified direction ('up', 'down', 'left', 'right').
+        Returns True if the board changed, False otherwise.
+        """
+        if self.game_over or direction not in DIRECTIONS:
+            return False
+
+        new_state, score_increase = move_state(self.state, direction)
+        if new_state == self.state:
+            return False
+
+        self.state = new_state
+        self.score += score_increase
+        self._add_random_tile()
+        if not self._can_move():
+            self.game_over = True
+        return True
+
+    def try_move(self, direction):
+        """
+        Simulates a move in the specified direction without changing the actual game state.
+        Returns a dictionary with the simulated board state and whether the move was valid.
+        """
+        if self.game_over or direction not in DIRECTIONS:
+            return {
+                "valid": False,
+                "board": self.board,
+                "score": self.score,
+                "game_over": self.game_over
+            }
+
+        new_state, score_increase = move_state(self.state, direction)
+        if new_state == self.state:
+            return {
+                "valid": False,
+                "board": self.board,
+                "score": self.score,
+                "game_over": self.game_over
+            }
+
+        # Spawn from a fork, so the game's own random sequence is not advanced
+        new_state = spawn_tile(new_state, self.rng.fork())
+        return {
+            "valid": True,
+            "board": decode_board(new_state),
+            "score": self.score + score_increase,
+            "game_over": not can_move(new_state)
+        }
+
+    def preview(self, direction):
+        """
+        Computes the post-slide board of a move without spawning a tile,
+        consuming random state or changing the game.
+        """
+        if self.game_over or direction not in DIRECTIONS:
+            new_state, score_increase = self.state, 0
+        else:
+            new_state, score_increase = move_state(self.state, direction)
+        return {
+            "valid": new_state != self.state,
+            "board": decode_board(new_state),
+            "score": self.score + score_increase,
+            "score_delta": score_increase
+        }
+
+    def preview_all(self):
+        """Previews all four directions at once, keyed by direction."""
+        return {direction: self.preview(direction) for direction in DIRECTIONS}
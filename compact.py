@@ -0,0 +1,131 @@
+from game_logic import GameLogic
+
+
+class CompactState:
+    """
+    A game state stored in a few dozen bytes: one byte of tile exponent per
+    cell (0 for empty, otherwise the tile is 2**exponent) plus score and flags.
+    Converts losslessly to and from the get_status() dictionary. States packed
+    from a game also keep its generator state, so the unpacked game spawns the
+    same tiles it would have. A 4x4 state taken from a bitboard game keeps the
+    64-bit board as is, and only unpacks its cells when they are read.
+    """
+
+    __slots__ = ('size', '_cells', '_bitboard', 'score', 'game_over', 'seed', 'rng_state')
+
+    def __init__(self, size, cells, score=0, game_over=False, seed=None, rng_state=None):
+        if len(cells) != size * size:
+            raise ValueError(f"Expected {size * size} cells, got {len(cells)}")
+        self.size = size
+        self._cells = bytes(cells)
+        self._bitboard = None
+        self.score = score
+        self.game_over = game_over
+        self.seed = seed
+        self.rng_state = rng_state
+
+    @classmethod
+    def from_bitboard(cls, state, score=0, game_over=False, seed=None, rng_state=None):
+        """Wraps a packed 4x4 bitboard (see bitboard.py) without unpacking it."""
+        compact = cls.__new__(cls)
+        compact.size = 4
+        compact._cells = None
+        compact._bitboard = state
+        compact.score = score
+        compact.game_over = game_over
+        compact.seed = seed
+        compact.rng_state = rng_state
+        return compact
+
+    @property
+    def cells(self):
+        """One byte of tile exponent per cell, row by row."""
+        if self._cells is None:
+            state = self._bitboard
+            self._cells = bytes((state >> (4 * i)) & 0xF for i in range(16))
+        return self._cells
+
+    def bitboard(self):
+        """Returns the state as a packed 4x4 bitboard. Raises ValueError if it does not fit one."""
+        if self._bitboard is None:
+            if self.size != 4 or max(self._cells) > 15:
+                raise ValueError("State does not fit a 4x4 bitboard")
+            state = 0
+            for i, exponent in enumerate(self._cells):
+                state |= exponent << (4 * i)
+            self._bitboard = state
+        return self._bitboard
+
+    @classmethod
+    def from_board(cls, board, score=0, game_over=False, seed=None, rng_state=None):
+        """Packs a list-of-lists board of tile values."""
+        size = len(board)
+        cells = bytearray(size * size)
+        for r, row in enumerate(board):
+            if len(row) != size:
+                raise ValueError("Board must be square")
+            for c, value in enumerate(row):
+                if value:
+                    exponent = value.bit_length() - 1
+                    if value != 1 << exponent or exponent == 0:
+                        raise ValueError(f"Not a tile value: {value}")
+                    cells[r * size + c] = exponent
+        return cls(size, cells, score, game_over, seed, rng_state)
+
+    @classmethod
+    def from_status(cls, status):
+        """Packs a get_status() dictionary."""
+        state = cls.from_board(status["board"], status["score"], status["game_over"], status.get("seed"))
+        if state.size != status.get("size", state.size):
+            raise ValueError("Board does not match the status size")
+        return state
+
+    @classmethod
+    def from_game(cls, game):
+        """Packs any game engine's current state."""
+        return cls.from_board(game.board, game.score, game.game_over, game.rng.seed, game.rng.state)
+
+    @property
+    def board(self):
+        """The board as a list of lists of tile values."""
+        size = self.size
+        cells = self.cells
+        return [[1 << e if e else 0 for e in cells[r * size:(r + 1) * size]] for r in range(size)]
+
+    def to_status(self):
+        """Returns the same dictionary as get_status() on the packed game."""
+        status = {
+            "board": self.board,
+            "score": self.score,
+            "game_over": self.game_over,
+            "size": self.size
+        }
+        if self.seed is not None:
+            status["seed"] = self.seed
+        return status
+
+    def to_game(self, engine="list"):
+        """
+        Unpacks into a playable game of the given engine without spawning any tiles.
+        'auto' picks the list engine for a 4x4 state the bitboard engine cannot play on,
+        one with two 32768 tiles or a larger tile.
+        """
+        if engine == "auto" and self.size == 4 and (max(self.cells) > 15 or self.cells.count(15) > 1):
+            engine = "list"
+        game_class = GameLogic.engine_class(engine, self.size)
+        return game_class.from_status(self.to_status(), self.rng_state)
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactState):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def _key(self):
+        return (self.size, self.cells, self.score, self.game_over, self.seed, self.rng_state)
+
+    def __repr__(self):
+        return (f"CompactState(size={self.size}, cells={self.cells!r}, score={self.score}, "
+                f"game_over={self.game_over}, seed={self.seed}, rng_state={self.rng_state})")
@@ -0,0 +1,172 @@
+import json
+import queue
+import threading
+
+# Events a subscriber may hold before it counts as too slow and is dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Subscriber:
+    """A bounded queue of events for one consumer, optionally limited to one game."""
+
+    def __init__(self, game_id=None, max_queue=SUBSCRIBER_QUEUE_SIZE):
+        self.game_id = game_id
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = False
+        # Set when the hub closes, e.g. on server shutdown; the stream should end
+        self.closed = False
+
+    def get(self, timeout=None):
+        """Returns the next event, or None if none arrived within the timeout or the hub closed."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    """
+    Publish/subscribe hub for game state changes.
+    Publishing never blocks: a subscriber whose queue is full is dropped instead.
+    """
+
+    def __init__(self, max_subscribers=None):
+        self._subscribers = []
+        self._lock = threading.Lock()
+        # Bumped whenever the hub goes from no subscribers to some, so that
+        # delta tracking done while nobody was listening is known to be stale
+        self.epoch = 0
+        # Subscribers allowed at once, None for no limit
+        self.max_subscribers = max_subscribers
+        self.closed = False
+
+    def open(self, max_subscribers=None):
+        """Accepts subscribers again after close, at most max_subscribers at once (None for no limit)."""
+        with self._lock:
+            self.max_subscribers = max_subscribers
+            self.closed = False
+
+    def close(self):
+        """Refuses new subscribers and wakes and removes the current ones, so their streams end."""
+        with self._lock:
+            self.closed = True
+            subscribers, self._subscribers = self._subscribers, []
+        for subscriber in subscribers:
+            subscriber.closed = True
+            try:
+                subscriber.queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def subscribe(self, game_id=None, max_queue=SUBSCRIBER_QUEUE_SIZE):
+        """Returns a new subscriber, or None if the hub is closed or already has max_subscribers."""
+        subscriber = Subscriber(game_id, max_queue)
+        with self._lock:
+            if self.closed or (self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers):
+                return None
+            if not self._subscribers:
+                self.epoch += 1
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, event):
+        """Queues an event for every subscriber interested in its game."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.game_id is not None and subscriber.game_id != event.get("game_id"):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except queue.Full:
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+
+
+def board_event(game_id, status, version):
+    """A full-board event, sent first and whenever a delta cannot be computed."""
+    return {
+        "type": "board",
+        "game_id": game_id,
+        "version": version,
+        "board": [list(row) for row in status["board"]],
+        "score": status["score"],
+        "game_over": status["game_over"],
+        "size": status["size"]
+    }
+
+
+def delta_event(game_id, old_board, old_score, status, version, base_version):
+    """
+    An event carrying only the cells that changed, as [row, col, value], and the score delta.
+    It applies to the board of base_version and gives the board of version.
+    """
+    board = status["board"]
+    cells = []
+    for r, (old_row, row) in enumerate(zip(old_board, board)):
+        if old_row != row:
+            for c, (old_value, value) in enumerate(zip(old_row, row)):
+                if old_value != value:
+                    cells.append([r, c, value])
+    return {
+        "type": "delta",
+        "game_id": game_id,
+        "version": version,
+        "base_version": base_version,
+        "cells": cells,
+        "score": status["score"],
+        "score_delta": status["score"] - old_score,
+        "game_over": status["game_over"]
+    }
+
+
+class StreamTracker:
+    """
+    Keeps one event stream consistent. It remembers the version of each game the stream
+    last sent, skips events that version already covers, and replaces a delta the stream
+    cannot apply (a game it has no board for yet, or a gap in the versions) with a full
+    board of the game's latest snapshot. latest_snapshot(game_id) returns a StatusSnapshot,
+    or None for a game that no longer exists.
+    """
+
+    def __init__(self, latest_snapshot):
+        self._latest_snapshot = latest_snapshot
+        self._versions = {}
+
+    def board(self, game_id):
+        """Returns a board event for the game's latest snapshot, or None if the game does not exist."""
+        snapshot = self._latest_snapshot(game_id)
+        if snapshot is None:
+            self._versions.pop(game_id, None)
+            return None
+        self._versions[game_id] = snapshot.version
+        return board_event(game_id, snapshot.status, snapshot.version)
+
+    def translate(self, event):
+        """Returns the event to send for a published event, or None if there is nothing to send."""
+        game_id = event["game_id"]
+        known = self._versions.get(game_id)
+        if known is not None and event["version"] <= known:
+            return None
+        if event["type"] == "board" or (known is not None and event["base_version"] == known):
+            self._versions[game_id] = event["version"]
+            return event
+        # Snapshots are published before their events, so this board is at least as new as the event
+        return self.board(game_id)
+
+
+def format_sse(event):
+    """Encodes an event as a server-sent events message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+# Shared hub for all games in this process
+hub = EventHub()
@@ -1,43 +1,186 @@
 import random
-import copy
+
+from rng import GameRandom
+import row_tables
+
+DIRECTIONS = ('up', 'down', 'left', 'right')
+
+# Board size from which the 'auto' engine switches to the numpy engine
+LARGE_BOARD_SIZE = 20
+
+# Lines repeat far more often than whole boards, so every merged line is memoized
+# here, shared by all games and sizes. The memo is emptied when it reaches the limit.
+MERGED_LINES_LIMIT = 1 << 16
+_merged_lines = {}
+# Lines looked up (counted once per slide) and computed, and times the memo was emptied
+_merged_line_counts = {"lookups": 0, "misses": 0, "clears": 0}
+
+
+def merged_lines_stats():
+    """Returns the line memo's entry count, hits, misses, clears and hit rate, like MoveCache.stats."""
+    lookups, misses, clears = (_merged_line_counts[key] for key in ("lookups", "misses", "clears"))
+    return {
+        "entries": len(_merged_lines),
+        "hits": lookups - misses,
+        "misses": misses,
+        "clears": clears,
+        "hit_rate": (lookups - misses) / lookups if lookups else 0.0
+    }
+
+
+def clear_merged_lines():
+    """Empties the line memo and resets its statistics."""
+    _merged_lines.clear()
+    _merged_line_counts.update(lookups=0, misses=0, clears=0)
+
 
 class GameLogic:
-    def __init__(self, size=4):
+    def __init__(self, size=4, seed=None):
         self.size = size
         self.board = [[0] * size for _ in range(size)]
         self.score = 0
         self.game_over = False
+        # Every game owns its generator, so games with the same seed and moves play out identically
+        self.rng = GameRandom(seed)
         # Add two initial tiles
         self._add_random_tile()
         self._add_random_tile()
 
+    @classmethod
+    def engine_class(cls, engine, size):
+        """
+        Returns the class implementing an engine for a board size.
+        'list' is this class, 'bitboard' is the packed 64-bit engine (size 4 only),
+        'numpy' is the array engine for large boards, and 'auto' picks the fastest for the size.
+        """
+        if engine == "auto":
+            if size == 4:
+                engine = "bitboard"
+            elif size >= LARGE_BOARD_SIZE:
+                engine = "numpy"
+            else:
+                engine = "list"
+        if engine == "bitboard":
+            from bitboard import BitboardGame
+            return BitboardGame
+        if engine == "numpy":
+            from large_board import LargeBoardGame
+            return LargeBoardGame
+        if engine == "list":
+            return cls
+        raise ValueError(f"Unknown engine: {engine}")
+
+    @classmethod
+    def create(cls, size=4, engine="list", seed=None):
+        """
+        Creates a new game using the requested engine, see engine_class.
+        All engines play identical games for the same seed and moves.
+        """
+        return cls.engine_class(engine, size)(size, seed)
+
+    @classmethod
+    def from_status(cls, status, rng_state=None):
+        """
+        Rebuilds a game from a get_status() dictionary without spawning any tiles.
+        The generator restarts from the status seed unless rng_state is given.
+        """
+        game = cls.__new__(cls)
+        game.size = status["size"]
+        game.board = [list(row) for row in status["board"]]
+        game.score = status["score"]
+        game.game_over = status["game_over"]
+        game.rng = GameRandom(status.get("seed"), rng_state)
+        return game
+
+    @classmethod
+    def replay(cls, seed, directions, size=4, engine="list"):
+        """Rebuilds a game from its seed and the directions played."""
+        game = cls.create(size=size, engine=engine, seed=seed)
+        for direction in directions:
+            game.move(direction)
+        return game
+
+    @property
+    def seed(self):
+        return self.rng.seed
+
+    # The number of empty cells in each row is kept up to date by every move,
+    # so spawning a tile and checking for game over need no scan of the board.
+
+    @property
+    def board(self):
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        """Replaces the board and recounts its empty cells. Assign a new board rather than editing cells in place."""
+        self._set_board(board, [row.count(0) for row in board])
+
+    def _set_board(self, board, row_empty):
+        self._board = board
+        self._row_empty = row_empty
+        self._empty = sum(row_empty)
+
     def get_status(self):
         """Returns the current state of the game."""
         return {
             "board": self.board,
             "score": self.score,
             "game_over": self.game_over,
-            "size": self.size
+            "size": self.size,
+            "seed": self.rng.seed
         }
 
-    def _get_empty_cells(self):
-        """Returns a list of coordinates (row, col) of empty cells."""
-        empty_cells = []
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.board[r][c] == 0:
-                    empty_cells.append((r, c))
-        return empty_cells
+    def snapshot(self):
+        """Returns the game state as an immutable CompactState, including the random generator."""
+        from compact import CompactState
+        return CompactState.from_game(self)
+
+    def deferred_snapshot(self):
+        """
+        Returns a function that gives the snapshot of the game as it is now, so a caller can
+        take it only once a move has succeeded. Moves replace the board rather than edit it,
+        so this costs nothing until the function is called.
+        """
+        from compact import CompactState
+        board, score, game_over, seed, rng_state = self._board, self.score, self.game_over, self.rng.seed, self.rng.state
+        return lambda: CompactState.from_board(board, score, game_over, seed, rng_state)
+
+    def restore(self, state):
+        """Puts the game back into a CompactState taken from a game of the same size."""
+        if state.size != self.size:
+            raise ValueError(f"Snapshot is for size {state.size}, not {self.size}")
+        self.board = state.board
+        self.score = state.score
+        self.game_over = state.game_over
+        self.rng = GameRandom(state.seed, state.rng_state)
+
+    def _place_tile(self, r, c, value):
+        """Puts a tile on an empty cell, keeping the empty-cell counts in step."""
+        self._board[r][c] = value
+        self._row_empty[r] -= 1
+        self._empty -= 1
 
     def _add_random_tile(self):
         """Adds a random tile (2 or 4) to an empty cell."""
-        empty_cells = self._get_empty_cells()
-        if not empty_cells:
+        if not self._empty:
             return False # No space left
 
-        r, c = random.choice(empty_cells)
+        # The k-th empty cell in row-major order, found through the per-row counts
+        k = self.rng.randrange(self._empty)
+        r = 0
+        for count in self._row_empty:
+            if k < count:
+                break
+            k -= count
+            r += 1
+        row = self._board[r]
+        c = -1
+        for _ in range(k + 1):
+            c = row.index(0, c + 1)
+
         # 90% chance of 2, 10% chance of 4
-        self.board[r][c] = 2 if random.random() < 0.9 else 4
+        self._place_tile(r, c, 2 if self.rng.random() < 0.9 else 4)
         return True
 
     def _compress(self, row):
@@ -58,98 +201,146 @@ class GameLogic:
         final_row = self._compress(new_row)
         return final_row, score_increase
 
-    def _rotate_board_clockwise(self):
-        """Rotates the board 90 degrees clockwise."""
-        new_board = [[0] * self.size for _ in range(self.size)]
-        for r in range(self.size):
-            for c in range(self.size):
-                new_board[c][self.size - 1 - r] = self.board[r][c]
-        self.board = new_board
-
-    def _rotate_board_counter_clockwise(self):
-        """Rotates the board 90 degrees counter-clockwise."""
-        new_board = [[0] * self.size for _ in range(self.size)]
-        for r in range(self.size):
-            for c in range(self.size):
-                new_board[self.size - 1 - c][r] = self.board[r][c]
-        self.board = new_board
-
-    def _move_left(self):
-        """Performs the 'left' move logic."""
-        moved = False
+    def _merge_line(self, line):
+        """
+        Slides and merges a tuple of tile values to the left, through the precomputed
+        row table for this size when there is one (see row_tables.py), else through _merge.
+        Returns (new_line, score_increase) with new_line as a tuple.
+        """
+        table = row_tables.load(self.size)
+        if table is not None:
+            result = table.lookup(line)
+            if result is not None:
+                return result
+        new_line, score_increase = self._merge(list(line))
+        return tuple(new_line), score_increase
+
+    def _slide(self, direction):
+        """
+        Computes the result of sliding the board in the given direction without
+        modifying the game or spawning a tile.
+        Returns (new_board, score_increase, moved, row_empty), where row_empty is the
+        number of empty cells in each row of new_board. Raises ValueError for an unknown direction.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Invalid direction: {direction}")
+
+        size = self.size
+        board = self._board
+        new_board = [row[:] for row in board]
+        line_empty = []
         total_score_increase = 0
-        new_board = []
-        for r in range(self.size):
-            original_row = self.board[r][:]
-            new_row, score_increase = self._merge(original_row)
-            new_board.append(new_row)
+        moved = False
+        merged_lines = _merged_lines
+        counts = _merged_line_counts
+        counts["lookups"] += size
+        for i in range(size):
+            # Read line i so that the move direction always points to its start
+            if direction == 'left':
+                line = tuple(board[i])
+            elif direction == 'right':
+                line = tuple(board[i][::-1])
+            elif direction == 'up':
+                line = tuple([board[r][i] for r in range(size)])
+            else:
+                line = tuple([board[r][i] for r in range(size - 1, -1, -1)])
+
+            merged = merged_lines.get(line)
+            if merged is None:
+                new_line, score_increase = self._merge_line(line)
+                # Tiles end up packed at the start of the line, followed by this many empty cells
+                merged = (new_line, score_increase, new_line.count(0))
+                counts["misses"] += 1
+                if len(merged_lines) >= MERGED_LINES_LIMIT:
+                    merged_lines.clear()
+                    counts["clears"] += 1
+                merged_lines[line] = merged
+            new_line, score_increase, empty = merged
+            line_empty.append(empty)
+            if new_line == line:
+                continue
+            moved = True
             total_score_increase += score_increase
-            if original_row != new_row:
-                moved = True
-        self.board = new_board
-        self.score += total_score_increase
-        return moved
+
+            if direction == 'left':
+                new_board[i] = list(new_line)
+            elif direction == 'right':
+                new_board[i] = list(new_line[::-1])
+            elif direction == 'up':
+                for r in range(size):
+                    new_board[r][i] = new_line[r]
+            else:
+                for r in range(size):
+                    new_board[size - 1 - r][i] = new_line[r]
+
+        if direction in ('left', 'right'):
+            row_empty = line_empty
+        else:
+            # at_least[k] is the number of columns with at least k empty cells. Sliding up
+            # leaves a column's empty cells at the bottom, sliding down at the top.
+            at_least = [0] * (size + 2)
+            for empty in line_empty:
+                at_least[empty] += 1
+            for k in range(size - 1, -1, -1):
+                at_least[k] += at_least[k + 1]
+            if direction == 'up':
+                row_empty = [at_least[size - r] for r in range(size)]
+            else:
+                row_empty = [at_least[r + 1] for r in range(size)]
+        return new_board, total_score_increase, moved, row_empty
 
     def move(self, direction):
         """
         Performs a move in the specified direction ('up', 'down', 'left', 'right').
         Returns True if the board changed, False otherwise.
         """
-        if self.game_over:
+        if self.game_over or direction not in DIRECTIONS:
             return False
 
-        original_board = copy.deepcopy(self.board)
-        moved = False
+        new_board, score_increase, moved, row_empty = self._slide(direction)
+        if moved:
+            self._set_board(new_board, row_empty)
+            self.score += score_increase
+            self._add_random_tile()
+            if not self._can_move():
+                self.game_over = True
+        return moved
 
-        if direction == 'left':
-            moved = self._move_left()
-        elif direction == 'right':
-            self._rotate_board_clockwise()
-            self._rotate_board_clockwise()
-            moved = self._move_left()
-            self._rotate_board_clockwise()
-            self._rotate_board_clockwise()
-        elif direction == 'up':
-            self._rotate_board_counter_clockwise()
-            moved = self._move_left()
-            self._rotate_board_clockwise()
-        elif direction == 'down':
-            self._rotate_board_clockwise()
-            moved = self._move_left()
-            self._rotate_board_counter_clockwise()
-        else:
-            # Invalid direction
+    def apply_move(self, direction, spawn):
+        """
+        Performs a move like move(), but places the given (row, col, value) tile
+        instead of a random one. Used to replay recorded games.
+        """
+        if self.game_over or direction not in DIRECTIONS:
             return False
 
+        new_board, score_increase, moved, row_empty = self._slide(direction)
         if moved:
-            self._add_random_tile()
+            r, c, value = spawn
+            if new_board[r][c]:
+                raise ValueError(f"Cannot spawn on occupied cell ({r}, {c})")
+            self._set_board(new_board, row_empty)
+            self._place_tile(r, c, value)
+            self.score += score_increase
             if not self._can_move():
                 self.game_over = True
-        
-        # Check again if board actually changed after adding tile potentially
-        # This handles cases where a move merges tiles but doesn't shift anything,
-        # and then the new tile fills the only empty spot, making the board look unchanged
-        # compared to the very start, but a valid move occurred.
-        # A simpler check is just if 'moved' was true.
-        # return self.board != original_board 
         return moved
 
 
     def _can_move(self):
         """Checks if any moves are possible."""
-        if self._get_empty_cells():
+        if self._empty:
             return True # Can always add a tile if empty cells exist
 
-        # Check for possible merges horizontally
-        for r in range(self.size):
-            for c in range(self.size - 1):
-                if self.board[r][c] == self.board[r][c+1]:
+        # Only a full board needs a scan for possible merges
+        board = self._board
+        for row in board:
+            for a, b in zip(row, row[1:]):
+                if a == b:
                     return True
-
-        # Check for possible merges vertically
-        for c in range(self.size):
-            for r in range(self.size - 1):
-                if self.board[r][c] == self.board[r+1][c]:
+        for upper, lower in zip(board, board[1:]):
+            for a, b in zip(upper, lower):
+                if a == b:
                     return True
 
         return False
@@ -159,31 +350,65 @@ class GameLogic:
         Simulates a move in the specified direction without changing the actual game state.
         Returns a dictionary with the simulated board state and whether the move was valid.
         """
-        if self.game_over:
+        if self.game_over or direction not in DIRECTIONS:
             return {
                 "valid": False,
-                "board": copy.deepcopy(self.board),
+                "board": [row[:] for row in self.board],
                 "score": self.score,
                 "game_over": self.game_over
             }
 
-        # Create a deep copy of the current game state
-        temp_game = GameLogic(self.size)
-        temp_game.board = copy.deepcopy(self.board)
-        temp_game.score = self.score
-        temp_game.game_over = self.game_over
+        new_board, score_increase, moved, row_empty = self._slide(direction)
+        if not moved:
+            return {
+                "valid": False,
+                "board": new_board,
+                "score": self.score,
+                "game_over": self.game_over
+            }
 
-        # Perform the move on the temporary game state
-        moved = temp_game.move(direction)
+        # Spawn the follow-up tile on the simulated board only, from a fork of
+        # the generator so the game's own random sequence is not advanced
+        saved = self._board, self._row_empty, self._empty, self.rng
+        self._set_board(new_board, row_empty)
+        self.rng = self.rng.fork()
+        try:
+            self._add_random_tile()
+            game_over = not self._can_move()
+        finally:
+            self._board, self._row_empty, self._empty, self.rng = saved
+        return {
+            "valid": True,
+            "board": new_board,
+            "score": self.score + score_increase,
+            "game_over": game_over
+        }
 
-        # Return the simulated result
+    def preview(self, direction):
+        """
+        Computes the post-slide board of a move without spawning a tile,
+        consuming random state or changing the game.
+        """
+        if self.game_over or direction not in DIRECTIONS:
+            return {
+                "valid": False,
+                "board": [row[:] for row in self.board],
+                "score": self.score,
+                "score_delta": 0
+            }
+
+        new_board, score_increase, moved, _ = self._slide(direction)
         return {
             "valid": moved,
-            "board": temp_game.board,
-            "score": temp_game.score,
-            "game_over": temp_game.game_over
+            "board": new_board,
+            "score": self.score + score_increase,
+            "score_delta": score_increase
         }
 
+    def preview_all(self):
+        """Previews all four directions at once, keyed by direction."""
+        return {direction: self.preview(direction) for direction in DIRECTIONS}
+
 # Example Usage (for testing)
 if __name__ == "__main__":
     game = GameLogic()
@@ -1,34 +1,390 @@
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from bitboard import BitboardGame, largest_tile_count
+import events
 from game_logic import GameLogic
+from history import GameHistory
+import metrics
+import wire
+
+# The session the original single-game routes and the GUI operate on
+DEFAULT_GAME_ID = "default"
+
+# Bounds for idle-session eviction
+MAX_SESSIONS = 10000
+SESSION_TTL = 3600  # seconds without a request before a session may be evicted
+COMPACT_AFTER = 60  # seconds without a request before a session's game is packed into a CompactState
+SWEEP_INTERVAL = 30  # seconds between background passes that evict and compact idle sessions
+
+# Snapshot versions, increasing across all sessions, so a recreated game never reuses one
+_versions = itertools.count(1)
+
+
+class StatusSnapshot:
+    """
+    An immutable copy of a game's status, published after every change so that
+    readers need no lock. The board is a tuple of tuples; the JSON body is encoded
+    by the first reader that needs it and then shared by all later ones.
+    The snapshot of a packed session holds only the CompactState, and rebuilds
+    the status from it when read.
+    """
+
+    __slots__ = ('_status', '_state', 'version', 'etag', '_body', '_compact_body')
+
+    def __init__(self, status, version, etag):
+        self._status = {**status, "board": tuple(tuple(row) for row in status["board"])}
+        self._state = None
+        self.version = version
+        self.etag = etag
+        self._body = None
+        self._compact_body = None
+
+    @classmethod
+    def packed(cls, state, version, etag):
+        """A snapshot of a CompactState that builds its status on first read."""
+        snapshot = cls.__new__(cls)
+        snapshot._status = None
+        snapshot._state = state
+        snapshot.version = version
+        snapshot.etag = etag
+        snapshot._body = None
+        snapshot._compact_body = None
+        return snapshot
+
+    @property
+    def status(self):
+        if self._status is None:
+            status = self._state.to_status()
+            self._status = {**status, "board": tuple(tuple(row) for row in status["board"])}
+        return self._status
+
+    @staticmethod
+    def _encode(status):
+        return (json.dumps(status, sort_keys=True, separators=(',', ':')) + "\n").encode()
+
+    @property
+    def body(self):
+        """The status as UTF-8 JSON bytes, keys sorted like the API's other responses."""
+        if self._body is None:
+            self._body = self._encode(self.status)
+        return self._body
+
+    @property
+    def compact_body(self):
+        """Like body, but with the board as an exponent string (see wire.py)."""
+        if self._compact_body is None:
+            self._compact_body = self._encode(wire.compact_body(self.status))
+        return self._compact_body
+
+    def to_status(self):
+        """Returns a new get_status()-style dictionary that the caller may change."""
+        return {**self.status, "board": [list(row) for row in self.status["board"]]}
+
+
+class Session:
+    """
+    One game plus the lock that serializes access to it, and its undo history.
+    An idle game may be packed into a CompactState; it is unpacked again on first access.
+    """
+
+    __slots__ = ('game_id', '_game', '_packed', 'engine', 'lock', 'last_used', 'published', 'history',
+                 'status_snapshot', '_token')
+
+    def __init__(self, game_id, game, engine="auto"):
+        self.game_id = game_id
+        self._game = game
+        self._packed = None
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # (hub epoch, board, score, version) last published to event subscribers
+        self.published = None
+        self.history = GameHistory()
+        # Random per session object, so an ETag never matches a game from before a server restart
+        self._token = uuid.uuid4().hex[:8]
+        self.status_snapshot = None
+        self.publish()
+
+    def publish(self):
+        """Publishes a new StatusSnapshot of the game. The caller holds the lock or owns the session."""
+        version = next(_versions)
+        snapshot = StatusSnapshot(self.game.get_status(), version, f"{self._token}-{version}")
+        self.status_snapshot = snapshot
+        return snapshot
+
+    @property
+    def game(self):
+        if self._game is None:
+            self._game = self._packed.to_game(self.engine)
+            self._packed = None
+        return self._game
+
+    @game.setter
+    def game(self, game):
+        # A new game cannot be undone into the old one; snapshots are kept
+        self._game = game
+        self._packed = None
+        self.history.clear()
+
+    # The methods below change the game, so the caller must hold the session lock
+
+    def _fit_engine(self):
+        """
+        Moves an 'auto' game from the bitboard to the list engine once it holds two 32768
+        tiles, which the bitboard cannot merge. The list engine plays on from the same state,
+        and decides again whether the game is over.
+        """
+        game = self._game
+        if self.engine == "auto" and isinstance(game, BitboardGame) and largest_tile_count(game.state) > 1:
+            game = GameLogic.from_status(game.get_status(), game.rng.state)
+            game.game_over = not game._can_move()
+            # Not through the game setter: the history stays valid
+            self._game = game
 
-# Shared game instance
-_game_instance = GameLogic()
+    def move(self, direction):
+        """Moves the game, keeping the state before the move on the undo stack."""
+        game = self.game
+        before = game.deferred_snapshot()
+        moved = game.move(direction)
+        if moved:
+            self.history.push(before())
+            self._fit_engine()
+        return moved
+
+    def undo(self):
+        """Takes back the last change. Returns False if there is nothing to undo."""
+        game = self.game
+        state = self.history.undo(game.snapshot())
+        if state is None:
+            return False
+        game.restore(state)
+        self._fit_engine()
+        return True
+
+    def redo(self):
+        """Repeats the last undone change. Returns False if there is nothing to redo."""
+        game = self.game
+        state = self.history.redo(game.snapshot())
+        if state is None:
+            return False
+        game.restore(state)
+        self._fit_engine()
+        return True
+
+    def restore(self, snapshot_id):
+        """
+        Restores a snapshot, which can itself be undone.
+        Raises KeyError for an unknown snapshot and ValueError if it does not fit the game.
+        """
+        game = self.game
+        state = self.history.load(snapshot_id)
+        before = game.snapshot()
+        if self.engine == "auto" and isinstance(game, BitboardGame) and state.size == game.size:
+            # The snapshot may be from before a reset, when the game had left the bitboard engine
+            self._game = state.to_game(self.engine)
+        else:
+            game.restore(state)
+        self.history.push(before)
+        self._fit_engine()
+
+    @property
+    def compacted(self):
+        return self._game is None
+
+    def compact(self):
+        """Packs the game unless a request is using it. Returns True if the session is now packed."""
+        if self._game is None:
+            return True
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            self._packed = self._game.snapshot()
+            self._game = None
+            # Keep only what is needed to rebuild the status, under the same version and ETag
+            snapshot = self.status_snapshot
+            self.status_snapshot = StatusSnapshot.packed(self._packed, snapshot.version, snapshot.etag)
+            # The next change is then sent to event streams as a full board
+            self.published = None
+        finally:
+            self.lock.release()
+        return True
+
+
+class SessionRegistry:
+    """
+    Games keyed by id, kept in least-recently-used order.
+    The registry lock only guards the mapping itself; each session has its own lock for game access.
+    The default session, which the GUI holds on to, is never evicted or compacted.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL, compact_after=COMPACT_AFTER,
+                 sweep_interval=SWEEP_INTERVAL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.compact_after = compact_after
+        self.sweep_interval = sweep_interval
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def create(self, game_id=None, size=4, engine="auto", seed=None):
+        """
+        Creates a new session, evicting idle ones if needed. Raises KeyError if the id is taken
+        and ValueError if it is not a non-empty string.
+        """
+        if game_id is not None and (not isinstance(game_id, str) or not game_id):
+            raise ValueError("game_id must be a non-empty string")
+        game = GameLogic.create(size=size, engine=engine, seed=seed)
+        with self._lock:
+            if game_id is None:
+                game_id = uuid.uuid4().hex
+            elif game_id in self._sessions:
+                raise KeyError(game_id)
+            session = Session(game_id, game, engine)
+            self._sessions[game_id] = session
+            self._evict_locked()
+            if self._sweeper is None and game_id != DEFAULT_GAME_ID:
+                # Only other games can be evicted, so the sweeps start with the first of them
+                self._sweeper = threading.Thread(target=self._sweep, name="session-sweeper", daemon=True)
+                self._sweeper.start()
+        return session
+
+    def get(self, game_id):
+        """Returns a session and marks it as recently used. Raises KeyError if it does not exist."""
+        with self._lock:
+            session = self._sessions[game_id]
+            self._sessions.move_to_end(game_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def peek(self, game_id):
+        """Returns a session without marking it as used, or None if it does not exist."""
+        with self._lock:
+            return self._sessions.get(game_id)
+
+    def delete(self, game_id):
+        """Removes a session. Raises KeyError if it does not exist."""
+        with self._lock:
+            del self._sessions[game_id]
+
+    def list(self):
+        """Returns the ids of all sessions, least recently used first."""
+        with self._lock:
+            return list(self._sessions)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def evict_idle(self):
+        """Removes sessions idle for longer than the TTL or beyond the size bound, and compacts idle ones."""
+        with self._lock:
+            return self._evict_locked()
+
+    def _sweep(self):
+        """Runs evict_idle every sweep_interval seconds, so idle sessions are freed without new requests."""
+        while True:
+            time.sleep(self.sweep_interval)
+            self.evict_idle()
+
+    def _evict_locked(self):
+        """
+        Walks from the least recently used end and stops at the first session that
+        needs nothing done; the caller holds the registry lock.
+        """
+        evicted = []
+        now = time.monotonic()
+        excess = len(self._sessions) - self.max_sessions
+        for game_id, session in self._sessions.items():
+            idle = now - session.last_used
+            over_capacity = len(evicted) < excess
+            if not over_capacity and idle <= min(self.ttl, self.compact_after):
+                break # Everything after this one was used more recently
+            if game_id == DEFAULT_GAME_ID:
+                continue
+            if over_capacity or idle > self.ttl:
+                evicted.append(game_id)
+            elif idle > self.compact_after:
+                session.compact()
+        # Removed after the walk, as the mapping cannot change while it is iterated
+        for game_id in evicted:
+            del self._sessions[game_id]
+        return evicted
+
+
+# Shared session registry, with the default game the GUI shows
+registry = SessionRegistry()
+registry.create(DEFAULT_GAME_ID)
 
 # GUI update callback
 _gui_update_callback = None
 
+def get_session(game_id=DEFAULT_GAME_ID):
+    """Gets a session by id. Raises KeyError if it does not exist."""
+    return registry.get(game_id)
+
 def get_instance():
-    """Gets the current game instance."""
-    global _game_instance
-    return _game_instance
+    """Gets the default game instance."""
+    return registry.get(DEFAULT_GAME_ID).game
 
 def set_instance(new_instance):
-    """Sets a new game instance and triggers GUI update if callback is set."""
-    global _game_instance
-    _game_instance = new_instance
-    
+    """Sets a new default game instance and triggers GUI update if callback is set."""
+    registry.get(DEFAULT_GAME_ID).game = new_instance
+
     # Trigger GUI update if callback is set
     trigger_gui_update()
 
-def reset_instance():
-    """Resets the game by creating a new GameLogic instance."""
-    set_instance(GameLogic())
+def reset_instance(engine=None, seed=None, size=None):
+    """
+    Resets the game by creating a new game, by default with the session's engine and the current size.
+    A seed makes the new game reproducible; without one a random seed is picked.
+    """
+    session = registry.get(DEFAULT_GAME_ID)
+    size = size or session.game.size
+    set_instance(GameLogic.create(size=size, engine=engine or session.engine, seed=seed))
 
 def set_gui_update_callback(callback):
     """Sets the function to call when the game state changes."""
     global _gui_update_callback
     _gui_update_callback = callback
 
-def trigger_gui_update():
-    """Triggers a GUI update with the current game state."""
-    if _gui_update_callback:
-        _gui_update_callback(_game_instance.get_status()) 
\ No newline at end of file
+def trigger_gui_update(game_id=DEFAULT_GAME_ID):
+    """
+    Announces a state change of a game, with its session lock held: publishes a new
+    status snapshot for lock-free readers, updates the GUI if it shows this game
+    and publishes the changed cells to event subscribers.
+    """
+    session = registry.peek(game_id)
+    if session is None:
+        return
+    status = session.publish().status
+    if _gui_update_callback and game_id == DEFAULT_GAME_ID:
+        if metrics.enabled:
+            with metrics.GUI_CALLBACK.time():
+                _gui_update_callback(status)
+        else:
+            _gui_update_callback(status)
+    publish_update(game_id)
+
+def publish_update(game_id=DEFAULT_GAME_ID):
+    """Publishes a game's change to the event hub as a delta against what was last published."""
+    hub = events.hub
+    if not hub.has_subscribers():
+        return
+    session = registry.peek(game_id)
+    if session is None:
+        return
+    # The snapshot's board is immutable, so it can be kept for the next delta as is
+    snapshot = session.status_snapshot
+    status = snapshot.status
+    published = session.published
+    if published is None or published[0] != hub.epoch or len(published[1]) != status["size"]:
+        event = events.board_event(game_id, status, snapshot.version)
+    else:
+        event = events.delta_event(game_id, published[1], published[2], status, snapshot.version, published[3])
+    session.published = (hub.epoch, status["board"], status["score"], snapshot.version)
+    hub.publish(event)
@@ -0,0 +1,425 @@
+"""
+Game operations shared by the Flask API and the in-process MCP mode.
+Each function returns (response_body, http_status_code), so both callers
+produce exactly the same responses.
+"""
+import logging
+import math
+import threading
+import time
+
+import game_manager
+from game_logic import GameLogic
+import metrics
+
+VALID_DIRECTIONS = ['up', 'down', 'left', 'right']
+
+# Board sizes accepted when creating or resetting a game
+MIN_SIZE = 2
+MAX_SIZE = 64
+
+# Seeds are stored as unsigned 64-bit integers in game records (see records.py)
+SEED_LIMIT = 2 ** 64
+
+# Deepest search suggest() runs without a time_limit; deeper ones can take minutes
+MAX_UNLIMITED_DEPTH = 5
+
+# Process pool used by suggest() when configured, see api.run_api
+parallel_solver = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most `rate` records through per `interval` seconds and notes how many were dropped."""
+
+    def __init__(self, rate=20, interval=1.0):
+        super().__init__()
+        self.rate = rate
+        self.interval = interval
+        self._window_start = 0.0
+        self._count = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_start >= self.interval:
+                self._window_start = now
+                self._count = 0
+                if self._dropped:
+                    record.msg = f"({self._dropped} messages suppressed) {record.msg}"
+                    self._dropped = 0
+            self._count += 1
+            if self._count > self.rate:
+                self._dropped += 1
+                return False
+        return True
+
+
+# Every move is logged at DEBUG level; logging goes to stderr, which keeps
+# stdout free for the MCP protocol when the games run in-process
+log = logging.getLogger("game")
+log.addFilter(RateLimitFilter())
+
+def _locked(session):
+    """Returns the session lock, timed when metrics are enabled."""
+    if metrics.enabled:
+        label = "default" if session.game_id == game_manager.DEFAULT_GAME_ID else "other"
+        return metrics.timed_lock(session.lock, label)
+    return session.lock
+
+def _get_session(game_id):
+    """Looks up a session, returning None if it does not exist."""
+    try:
+        return game_manager.get_session(game_id)
+    except KeyError:
+        return None
+
+def _unknown_game(game_id):
+    return {"result": "fail", "error": f"Unknown game: {game_id}"}, 404
+
+# --- Sessions ---
+
+def _check_seed(seed):
+    """Returns an error response unless seed is None or an integer from 0 to SEED_LIMIT - 1."""
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or not 0 <= seed < SEED_LIMIT):
+        return {"result": "fail", "error": "seed must be an integer from 0 to 2**64 - 1"}, 400
+    return None
+
+def _check_size(size):
+    """Returns an error response unless size is None or a supported board size."""
+    if size is not None and (not isinstance(size, int) or isinstance(size, bool) or not MIN_SIZE <= size <= MAX_SIZE):
+        return {"result": "fail", "error": f"size must be an integer from {MIN_SIZE} to {MAX_SIZE}"}, 400
+    return None
+
+def create_game(game_id=None, size=4, engine="auto", seed=None):
+    """Creates a new game session."""
+    error = _check_seed(seed) or _check_size(size)
+    if error:
+        return error
+    try:
+        session = game_manager.registry.create(game_id=game_id, size=size, engine=engine, seed=seed)
+    except KeyError:
+        return {"result": "fail", "error": "Game id already exists"}, 409
+    except (TypeError, ValueError) as e:
+        return {"result": "fail", "error": str(e)}, 400
+    with _locked(session):
+        status = session.status_snapshot.status
+    return {"result": "ok", "game_id": session.game_id, "status": status}, 201
+
+def list_games():
+    """Lists the ids of all game sessions."""
+    return {"result": "ok", "games": game_manager.registry.list()}, 200
+
+def delete_game(game_id):
+    """Deletes a game session. The default game cannot be deleted."""
+    if game_id == game_manager.DEFAULT_GAME_ID:
+        return {"result": "fail", "error": "The default game cannot be deleted"}, 400
+    try:
+        game_manager.registry.delete(game_id)
+    except KeyError:
+        return _unknown_game(game_id)
+    return {"result": "ok", "message": "Game deleted"}, 200
+
+# --- Games ---
+
+def get_status_snapshot(game_id=game_manager.DEFAULT_GAME_ID):
+    """
+    Returns the game's latest published StatusSnapshot without taking its lock,
+    or an error body for an unknown game.
+    """
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+    return session.status_snapshot, 200
+
+def get_status(game_id=game_manager.DEFAULT_GAME_ID):
+    """Returns the current game status, read from the published snapshot without locking."""
+    snapshot, status_code = get_status_snapshot(game_id)
+    if status_code != 200:
+        return snapshot, status_code
+    return snapshot.to_status(), 200
+
+def move(direction, game_id=game_manager.DEFAULT_GAME_ID):
+    """Attempts to make a move in the specified direction."""
+    if direction not in VALID_DIRECTIONS:
+        return {"result": "fail", "error": "Invalid direction"}, 400
+
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+
+    result_status = "fail"
+    error_message = None
+    status_code = 200 # Default OK
+
+    with _locked(session):
+        game_instance = session.game
+        if game_instance.game_over:
+            result_status = "fail"
+            error_message = "Game is over"
+            status_code = 400 # Bad request as game is over
+        else:
+            try:
+                moved = session.move(direction)
+                if moved:
+                    result_status = "ok"
+                    # Explicitly trigger GUI update
+                    game_manager.trigger_gui_update(game_id)
+                else:
+                    # Check if the game is over *after* the move attempt
+                    if game_instance.game_over:
+                         result_status = "fail"
+                         error_message = "Game over - no more moves possible"
+                         status_code = 400 # Game ended
+                         # Explicitly trigger GUI update to show final state
+                         game_manager.trigger_gui_update(game_id)
+                    else:
+                        result_status = "ok"
+                        error_message = "but your move did not change the board"
+            except Exception as e:
+                result_status = "fail"
+                error_message = f"Internal server error: {str(e)}"
+                status_code = 500
+                log.exception("Error during move '%s'", direction) # Log internal errors
+                # The move may have got halfway, so publish whatever state it left
+                session.publish()
+
+        # Every change publishes a snapshot, so the latest one is the current status
+        current_status = session.status_snapshot.status
+    log.debug("<%s>: %s %s %s", direction, current_status, result_status, error_message)
+    response = {
+        "game_result": result_status,
+        "current_status": current_status
+    }
+    if error_message:
+        response["error"] = error_message
+
+    return response, status_code
+
+def moves(directions, stop_on_game_over=True, game_id=game_manager.DEFAULT_GAME_ID):
+    """
+    Applies a sequence of moves under a single lock acquisition.
+    Returns per-step validity and score deltas, plus only the final status.
+    """
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+
+    if not isinstance(directions, list) or any(d not in VALID_DIRECTIONS for d in directions):
+        return {"result": "fail", "error": "directions must be a list of up, down, left or right"}, 400
+    if not isinstance(stop_on_game_over, bool):
+        return {"result": "fail", "error": "stop_on_game_over must be true or false"}, 400
+
+    steps = []
+    with _locked(session):
+        game_instance = session.game
+        if game_instance.game_over:
+            return {
+                "game_result": "fail",
+                "error": "Game is over",
+                "steps": steps,
+                "current_status": session.status_snapshot.status
+            }, 400
+
+        any_moved = False
+        for direction in directions:
+            if game_instance.game_over and stop_on_game_over:
+                break
+            score_before = game_instance.score
+            moved = session.move(direction)
+            any_moved = any_moved or moved
+            steps.append({
+                "direction": direction,
+                "valid": moved,
+                "score_delta": game_instance.score - score_before
+            })
+
+        if any_moved:
+            game_manager.trigger_gui_update(game_id)
+        current_status = session.status_snapshot.status
+
+    response = {
+        "game_result": "ok",
+        "applied": len(steps),
+        "steps": steps,
+        "current_status": current_status
+    }
+    if current_status["game_over"]:
+        response["error"] = "Game over - no more moves possible"
+    return response, 200
+
+def reset_game(game_id=game_manager.DEFAULT_GAME_ID, seed=None, size=None):
+    """
+    Resets the game to its initial state, replaying the same game when given the same seed.
+    A size starts a board of that size instead of the current one.
+    """
+    error = _check_seed(seed) or _check_size(size)
+    if error:
+        return error
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+    with _locked(session):
+        try:
+            if game_id == game_manager.DEFAULT_GAME_ID:
+                game_manager.reset_instance(seed=seed, size=size)
+            else:
+                size = size or session.game.size
+                session.game = GameLogic.create(size=size, engine=session.engine, seed=seed)
+                game_manager.trigger_gui_update(game_id)
+        except ValueError as e:
+            # e.g. a size the session's engine does not support
+            return {"result": "fail", "error": str(e)}, 400
+        seed = session.game.seed
+        size = session.game.size
+    return {"result": "ok", "message": "Game reset successfully", "seed": seed, "size": size}, 200
+
+# --- History ---
+
+def _history_response(session, status):
+    history = session.history
+    return {
+        "result": "ok",
+        "current_status": status,
+        "undo_depth": history.undo_depth,
+        "redo_depth": history.redo_depth
+    }, 200
+
+def undo(game_id=game_manager.DEFAULT_GAME_ID):
+    """Takes back the last move or restore."""
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+    with _locked(session):
+        if not session.undo():
+            return {"result": "fail", "error": "Nothing to undo"}, 400
+        game_manager.trigger_gui_update(game_id)
+        status = session.status_snapshot.status
+    return _history_response(session, status)
+
+def redo(game_id=game_manager.DEFAULT_GAME_ID):
+    """Repeats the last undone move or restore."""
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+    with _locked(session):
+        if not session.redo():
+            return {"result": "fail", "error": "Nothing to redo"}, 400
+        game_manager.trigger_gui_update(game_id)
+        status = session.status_snapshot.status
+    return _history_response(session, status)
+
+def snapshot(game_id=game_manager.DEFAULT_GAME_ID):
+    """Saves the current game state and returns an id to restore it with."""
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+    with _locked(session):
+        snapshot_id = session.history.save(session.game.snapshot())
+        snapshot_ids = session.history.snapshot_ids()
+    return {"result": "ok", "snapshot_id": snapshot_id, "snapshots": snapshot_ids}, 200
+
+def restore(snapshot_id, game_id=game_manager.DEFAULT_GAME_ID):
+    """Puts the game back into a saved snapshot. The restore itself can be undone."""
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+    with _locked(session):
+        try:
+            session.restore(snapshot_id)
+        except KeyError:
+            return {"result": "fail", "error": f"Unknown snapshot: {snapshot_id}"}, 404
+        except ValueError as e:
+            return {"result": "fail", "error": str(e)}, 400
+        game_manager.trigger_gui_update(game_id)
+        status = session.status_snapshot.status
+    return _history_response(session, status)
+
+def try_move(direction, game_id=game_manager.DEFAULT_GAME_ID):
+    """Simulates a move in the specified direction without affecting the actual game state."""
+    if direction not in VALID_DIRECTIONS:
+        return {"result": "fail", "error": "Invalid direction"}, 400
+
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+
+    with _locked(session):
+        game_instance = session.game
+        # Use the try_move method to simulate the move without changing the game state
+        result = game_instance.try_move(direction)
+
+    response = {
+        "game_result": "ok" if result["valid"] else "fail",
+        "simulated_status": {
+            "board": result["board"],
+            "score": result["score"],
+            "game_over": result["game_over"],
+            "size": game_instance.size
+        }
+    }
+
+    if not result["valid"]:
+        if result["game_over"]:
+            response["error"] = "Game over - no more moves possible"
+        else:
+            response["error"] = "Move would not change the board"
+
+    return response, 200
+
+def try_move_all(game_id=game_manager.DEFAULT_GAME_ID):
+    """Previews all four directions at once without spawning tiles or affecting the game state."""
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+
+    with _locked(session):
+        game_instance = session.game
+        previews = game_instance.preview_all()
+        size = game_instance.size
+        game_over = game_instance.game_over
+
+    response = {
+        "game_result": "ok" if any(p["valid"] for p in previews.values()) else "fail",
+        "size": size,
+        "game_over": game_over,
+        "previews": previews
+    }
+    if game_over:
+        response["error"] = "Game over - no more moves possible"
+
+    return response, 200
+
+def suggest(depth=3, time_limit=None, game_id=game_manager.DEFAULT_GAME_ID):
+    """Runs an expectimax search from the current board and returns the best direction."""
+    if not 1 <= depth <= 8:
+        return {"result": "fail", "error": "depth must be between 1 and 8"}, 400
+    if time_limit is not None and not (math.isfinite(time_limit) and time_limit > 0):
+        return {"result": "fail", "error": "time_limit must be a positive number of seconds"}, 400
+    if time_limit is None and depth > MAX_UNLIMITED_DEPTH:
+        return {"result": "fail", "error": f"depth above {MAX_UNLIMITED_DEPTH} requires a time_limit"}, 400
+
+    # Imported on first use: building the solver's tables would slow down startup
+    import solver
+
+    session = _get_session(game_id)
+    if session is None:
+        return _unknown_game(game_id)
+
+    with _locked(session):
+        game_instance = session.game
+        if game_instance.game_over:
+            return {"result": "fail", "error": "Game is over"}, 400
+        try:
+            state = solver.game_to_state(game_instance)
+        except ValueError as e:
+            return {"result": "fail", "error": str(e)}, 400
+
+    # Search outside the lock so moves and status reads are not held up
+    if parallel_solver is not None:
+        result = parallel_solver.search(state, depth=depth, time_limit=time_limit)
+    else:
+        search = solver.ExpectimaxSolver(depth=depth, time_limit=time_limit)
+        result = search.search(state)
+    return {"result": "ok", **result}, 200
@@ -1,35 +1,74 @@
 import tkinter as tk
 from tkinter import messagebox
 from game_logic import GameLogic
+import queue
 import threading # To run the game logic updates separately
 import game_manager
 
+# Milliseconds between repaints of state pushed from other threads (~60 per second)
+FRAME_MS = 16
+
+# Width and height of the board in pixels; tiles shrink as the board grows
+BOARD_PX = 440
+# Smallest font, in pixels, worth drawing; smaller tiles show only their color
+MIN_FONT_PX = 7
+
+
+class TkUpdateBridge:
+    """
+    Hands game states from any thread to the Tk thread.
+    submit() only queues the state and never touches Tk, so API threads never wait on
+    the GUI. The Tk thread drains the queue once per frame and applies only the newest
+    state, so a burst of moves costs a single repaint.
+    """
+
+    def __init__(self, widget, apply, interval_ms=FRAME_MS):
+        self.widget = widget
+        self.apply = apply
+        self.interval_ms = interval_ms
+        self._queue = queue.SimpleQueue()
+        self.widget.after(self.interval_ms, self._poll)
+
+    def submit(self, state):
+        """Queues a state for the Tk thread; safe to call from any thread."""
+        self._queue.put(state)
+
+    def _poll(self):
+        latest = None
+        try:
+            while True:
+                latest = self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        if latest is not None:
+            self.apply(latest)
+        self.widget.after(self.interval_ms, self._poll)
+
+
 class GameGUI(tk.Frame):
     def __init__(self, master=None):
         super().__init__(master)
         self.master = master
         self.master.title('2048 Game')
         self.game = game_manager.get_instance()
-        self.grid_cells = []
+        # (rectangle, text) canvas items of every cell
+        self.cell_items = []
+        # Value each cell currently shows, so repaints only touch changed cells
+        self.rendered = []
+        self.game_over_shown = False
         self.init_grid()
         self.update_grid()
+        self.bridge = TkUpdateBridge(self, self.apply_game_state)
         self.master.bind("<Key>", self.key_press)
         # Prevent resizing
         self.master.resizable(False, False)
 
     def init_grid(self):
-        background = tk.Frame(self, bg='#92877d', bd=3, width=400, height=400)
-        background.grid(pady=(80, 0)) # Add padding on top for score
-
-        for i in range(self.game.size):
-            grid_row = []
-            for j in range(self.game.size):
-                cell = tk.Frame(background, bg='#eee4da', width=100, height=100)
-                cell.grid(row=i, column=j, padx=5, pady=5)
-                t = tk.Label(master=cell, text="", bg='#eee4da', justify=tk.CENTER, font=('Helvetica', 30, 'bold'), width=4, height=2)
-                t.grid()
-                grid_row.append(t)
-            self.grid_cells.append(grid_row)
+        # The whole board is one canvas with a rectangle and a text item per cell,
+        # which stays fast for large boards where a widget per cell would not
+        self.canvas = tk.Canvas(self, width=BOARD_PX, height=BOARD_PX, bg='#92877d', highlightthickness=0)
+        self.canvas.grid(pady=(80, 0)) # Add padding on top for score
+        self.build_cells(self.game.size)
 
         # Score display
         self.score_label = tk.Label(self, text=f"Score: {self.game.score}", font=('Helvetica', 18, 'bold'))
@@ -42,25 +81,66 @@ class GameGUI(tk.Frame):
 
     def reset_game(self):
         """Resets the game to its initial state."""
-        game_manager.reset_instance()
-        # Update our reference to the new game instance
-        self.game = game_manager.get_instance()
+        with game_manager.get_session().lock:
+            game_manager.reset_instance()
+            # Update our reference to the new game instance
+            self.game = game_manager.get_instance()
+            status = self.game.get_status()
         # Update the GUI
-        self.update_grid()
+        self.apply_game_state(status)
+
+    def build_cells(self, size):
+        """(Re)creates the canvas items for a board of the given size."""
+        self.canvas.delete('all')
+        self.pitch = BOARD_PX / size
+        gap = max(1, round(self.pitch * 0.05))
+        self.cell_items = []
+        for i in range(size):
+            row_items = []
+            for j in range(size):
+                x, y = j * self.pitch, i * self.pitch
+                rect = self.canvas.create_rectangle(x + gap, y + gap, x + self.pitch - gap, y + self.pitch - gap,
+                                                    fill='#cdc1b4', width=0)
+                text = self.canvas.create_text(x + self.pitch / 2, y + self.pitch / 2, text="")
+                row_items.append((rect, text))
+            self.cell_items.append(row_items)
+        self.rendered = [[None] * size for _ in range(size)]
+
+    def tile_font(self, value):
+        """A bold font, sized in pixels so the value fits its tile, or None if the tile is too small for text."""
+        digits = len(str(value))
+        pixels = int(min(self.pitch * 0.4, self.pitch * 1.4 / max(digits, 2)))
+        if pixels < MIN_FONT_PX:
+            return None
+        return ('Helvetica', -pixels, 'bold')
 
-    def update_grid(self):
-        """Updates the GUI grid based on the game board state."""
-        for i in range(self.game.size):
-            for j in range(self.game.size):
-                value = self.game.board[i][j]
-                cell_label = self.grid_cells[i][j]
+    def update_grid(self, board=None, score=None):
+        """Updates the GUI grid, reconfiguring only the cells whose value changed."""
+        if board is None:
+            board = self.game.board
+            score = self.game.score
+        if len(board) != len(self.cell_items):
+            # The board was reset to another size
+            self.build_cells(len(board))
+        for i, row in enumerate(board):
+            rendered_row = self.rendered[i]
+            for j, value in enumerate(row):
+                if rendered_row[j] == value:
+                    continue
+                rendered_row[j] = value
+                rect, text = self.cell_items[i][j]
                 if value == 0:
-                    cell_label.configure(text="", bg='#cdc1b4')
+                    self.canvas.itemconfigure(rect, fill='#cdc1b4')
+                    self.canvas.itemconfigure(text, text="")
                 else:
                     text_color, bg_color = self.get_tile_colors(value)
-                    cell_label.configure(text=str(value), bg=bg_color, fg=text_color)
-        self.score_label.configure(text=f"Score: {self.game.score}")
-        self.update_idletasks() # Force GUI update
+                    self.canvas.itemconfigure(rect, fill=bg_color)
+                    font = self.tile_font(value)
+                    if font is None:
+                        self.canvas.itemconfigure(text, text="")
+                    else:
+                        self.canvas.itemconfigure(text, text=str(value), fill=text_color, font=font)
+        self.score_label.configure(text=f"Score: {score}")
 
     def get_tile_colors(self, value):
         """Returns text and background colors for a given tile value."""
@@ -89,44 +169,49 @@ class GameGUI(tk.Frame):
 
     def key_press(self, event):
         """Handles keyboard input."""
-        if self.game.game_over:
-            return # Ignore input if game is over
-
-        key = event.keysym
-        moved = False
-        if key == 'Up':
-            moved = self.game.move('up')
-        elif key == 'Down':
-            moved = self.game.move('down')
-        elif key == 'Left':
-            moved = self.game.move('left')
-        elif key == 'Right':
-            moved = self.game.move('right')
-
-        if moved:
-            # Instead of directly updating the grid, trigger update through manager
-            # This ensures consistency and notifies other clients
-            game_manager.trigger_gui_update()
-            # Game over check is now handled only in update_game_state
-
-    def show_game_over(self):
+        directions = {'Up': 'up', 'Down': 'down', 'Left': 'left', 'Right': 'right'}
+        direction = directions.get(event.keysym)
+        if direction is None:
+            return
+
+        # Share the API's lock so key presses and API moves never interleave
+        with game_manager.get_session().lock:
+            # The API may have replaced the game (e.g. on reset)
+            self.game = game_manager.get_instance()
+            if self.game.game_over:
+                return # Ignore input if game is over
+            if game_manager.get_session().move(direction):
+                # Instead of directly updating the grid, trigger update through manager
+                # This ensures consistency and notifies other clients
+                game_manager.trigger_gui_update()
+                # Game over check is now handled only in apply_game_state
+
+    def show_game_over(self, score):
         """Displays the game over message."""
-        messagebox.showinfo("Game Over", f"Game Over! Your score: {self.game.score}")
+        messagebox.showinfo("Game Over", f"Game Over! Your score: {score}")
 
     def update_game_state(self, new_state):
-        """Updates the GUI based on a new game state dictionary (from API)."""
-        self.game.board = new_state['board']
-        self.game.score = new_state['score']
-        self.game.game_over = new_state['game_over']
-        self.update_grid()
-        if self.game.game_over:
-            self.show_game_over()
+        """
+        Receives a new game state dictionary (from the API or any other thread).
+        The repaint happens later on the Tk thread, see TkUpdateBridge.
+        """
+        self.bridge.submit(new_state)
+
+    def apply_game_state(self, new_state):
+        """Repaints the GUI from a game state dictionary; runs on the Tk thread."""
+        self.update_grid(new_state['board'], new_state['score'])
+        if new_state['game_over'] and not self.game_over_shown:
+            self.game_over_shown = True
+            self.show_game_over(new_state['score'])
+        elif not new_state['game_over']:
+            self.game_over_shown = False
 
 
 def run_gui():
     """Initializes and runs the Tkinter GUI."""
     root = tk.Tk()
     gui = GameGUI(master=root)
+    game_manager.set_gui_update_callback(gui.update_game_state)
     gui.pack()
     root.mainloop()
 
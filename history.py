@@ -0,0 +1,86 @@
+from collections import OrderedDict
+
+# Bounds on the states kept per game
+UNDO_LIMIT = 100
+SNAPSHOT_LIMIT = 64
+
+
+class GameHistory:
+    """
+    Bounded undo/redo stacks and numbered snapshots of one game.
+    Every entry is an immutable CompactState, so history never holds a copy of a grid
+    and entries can be shared between the stacks and the snapshots. The stacks are
+    plain lists that grow with use, and they and the snapshot map are only created
+    when first needed, so that the many sessions that barely use them stay small.
+    """
+
+    __slots__ = ('_undo', '_redo', '_snapshots', '_undo_limit', '_snapshot_limit', '_next_id')
+
+    def __init__(self, undo_limit=UNDO_LIMIT, snapshot_limit=SNAPSHOT_LIMIT):
+        self._undo = None
+        self._redo = None
+        self._snapshots = None
+        self._undo_limit = undo_limit
+        self._snapshot_limit = snapshot_limit
+        self._next_id = 1
+
+    @property
+    def undo_depth(self):
+        return len(self._undo) if self._undo else 0
+
+    @property
+    def redo_depth(self):
+        return len(self._redo) if self._redo else 0
+
+    def _append(self, stack, state):
+        stack.append(state)
+        if len(stack) > self._undo_limit:
+            del stack[0]
+
+    def push(self, state):
+        """Records the state before a change. A new change discards what could be redone."""
+        if self._undo is None:
+            self._undo = []
+        self._append(self._undo, state)
+        self._redo = None
+
+    def undo(self, current):
+        """Returns the state to go back to, keeping current for redo, or None if there is nothing to undo."""
+        if not self._undo:
+            return None
+        if self._redo is None:
+            self._redo = []
+        self._append(self._redo, current)
+        return self._undo.pop()
+
+    def redo(self, current):
+        """Returns the state to go forward to, keeping current for undo, or None if there is nothing to redo."""
+        if not self._redo:
+            return None
+        self._append(self._undo, current)
+        return self._redo.pop()
+
+    def clear(self):
+        """Forgets the undo and redo stacks, but keeps the snapshots."""
+        self._undo = None
+        self._redo = None
+
+    def save(self, state):
+        """Keeps a snapshot and returns its id. The oldest snapshot is dropped beyond the limit."""
+        if self._snapshots is None:
+            self._snapshots = OrderedDict()
+        snapshot_id = self._next_id
+        self._next_id += 1
+        self._snapshots[snapshot_id] = state
+        while len(self._snapshots) > self._snapshot_limit:
+            self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def load(self, snapshot_id):
+        """Returns a snapshot. Raises KeyError if it does not exist."""
+        if self._snapshots is None:
+            raise KeyError(snapshot_id)
+        return self._snapshots[snapshot_id]
+
+    def snapshot_ids(self):
+        return list(self._snapshots) if self._snapshots else []
@@ -0,0 +1,238 @@
+import numpy as np
+
+from batch import _slide_left
+import move_cache
+from rng import GameRandom
+
+DIRECTIONS = ('up', 'down', 'left', 'right')
+
+# Largest exponent whose tile value still fits an int64
+MAX_INT64_EXPONENT = 62
+
+
+def _orient(cells, direction):
+    """Returns a view of the board in which the given direction becomes 'left'."""
+    if direction == 'up':
+        return cells.T
+    if direction == 'down':
+        return cells.T[:, ::-1]
+    if direction == 'left':
+        return cells
+    return cells[:, ::-1]
+
+
+def _values(cells):
+    """Converts an exponent array into a list-of-lists board of tile values."""
+    if cells.max(initial=0) > MAX_INT64_EXPONENT:
+        return [[1 << e if e else 0 for e in row] for row in cells.tolist()]
+    return np.where(cells == 0, 0, np.left_shift(1, cells.astype(np.int64))).tolist()
+
+
+def _exponents(board):
+    """Converts a list-of-lists board of tile values into a uint8 exponent array."""
+    return np.array([[value.bit_length() - 1 if value else 0 for value in row] for row in board], dtype=np.uint8)
+
+
+class LargeBoardGame:
+    """
+    A game for big boards (8x8 and up) backed by a numpy array of tile exponents.
+    A move slides and merges all rows at once through the batch simulator's row kernel,
+    reading the board through a transposed or reversed view instead of rotating it.
+    Plays exactly like GameLogic for the same seed and moves.
+    """
+
+    def __init__(self, size=8, seed=None):
+        if size < 2:
+            raise ValueError(f"Board size must be at least 2, got {size}")
+        self.size = size
+        self.cells = np.zeros((size, size), dtype=np.uint8)
+        self.score = 0
+        self.game_over = False
+        self.rng = GameRandom(seed)
+        # Add two initial tiles
+        self._add_random_tile()
+        self._add_random_tile()
+
+    @classmethod
+    def from_status(cls, status, rng_state=None):
+        """
+        Rebuilds a game from a get_status() dictionary without spawning any tiles.
+        The generator restarts from the status seed unless rng_state is given.
+        """
+        game = cls.__new__(cls)
+        game.size = status["size"]
+        game.cells = _exponents(status["board"])
+        game.score = status["score"]
+        game.game_over = status["game_over"]
+        game.rng = GameRandom(status.get("seed"), rng_state)
+        return game
+
+    @property
+    def seed(self):
+        return self.rng.seed
+
+    @property
+    def board(self):
+        """The board as a list of lists of tile values, like GameLogic.board."""
+        return _values(self.cells)
+
+    @board.setter
+    def board(self, board):
+        self.cells = _exponents(board)
+
+    def get_status(self):
+        """Returns the current state of the game."""
+        return {
+            "board": self.board,
+            "score": self.score,
+            "game_over": self.game_over,
+            "size": self.size,
+            "seed": self.rng.seed
+        }
+
+    def snapshot(self):
+        """Returns the game state as an immutable CompactState, including the random generator."""
+        from compact import CompactState
+        return CompactState(self.size, self.cells.tobytes(), self.score, self.game_over,
+                            self.rng.seed, self.rng.state)
+
+    def deferred_snapshot(self):
+        """
+        Returns a function that gives the snapshot of the game as it is now. Moves replace
+        the cell array rather than edit it, so this costs nothing until the function is called.
+        """
+        from compact import CompactState
+        cells, score, game_over, seed, rng_state = self.cells, self.score, self.game_over, self.rng.seed, self.rng.state
+        return lambda: CompactState(self.size, cells.tobytes(), score, game_over, seed, rng_state)
+
+    def restore(self, state):
+        """Puts the game back into a CompactState taken from a game of the same size."""
+        if state.size != self.size:
+            raise ValueError(f"Snapshot is for size {state.size}, not {self.size}")
+        self.cells = np.frombuffer(state.cells, dtype=np.uint8).reshape(self.size, self.size).copy()
+        self.score = state.score
+        self.game_over = state.game_over
+        self.rng = GameRandom(state.seed, state.rng_state)
+
+    def _add_random_tile(self, cells=None):
+        """Adds a random tile (2 or 4) to an empty cell, choosing cells in row-major order like GameLogic."""
+        if cells is None:
+            cells = self.cells
+        empty = np.flatnonzero(cells.ravel() == 0)
+        if empty.size == 0:
+            return False # No space left
+
+        i = empty[self.rng.randrange(empty.size)]
+        # 90% chance of 2, 10% chance of 4
+        cells.flat[i] = 1 if self.rng.random() < 0.9 else 2
+        return True
+
+    def _slide(self, direction):
+        """
+        Computes the result of sliding the board in the given direction without
+        modifying the game or spawning a tile. Returns (new_cells, score_increase, moved).
+        Positions slid before, by any game in the process, come from the shared move cache.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Invalid direction: {direction}")
+        cache = move_cache.cache
+        if not cache.max_cells:
+            return self._compute_slide(direction)
+        # The size is part of the key, as boards of different sizes can have the same bytes
+        key = (self.size, self.cells.tobytes(), direction)
+        cached = cache.get(key)
+        if cached is not None:
+            cells, score_increase, moved = cached
+            return np.frombuffer(cells, dtype=np.uint8).reshape(self.size, self.size).copy(), score_increase, moved
+
+        new_cells, score_increase, moved = self._compute_slide(direction)
+        cache.put(key, (new_cells.tobytes(), score_increase, moved), self.size * self.size)
+        return new_cells, score_increase, moved
+
+    def _compute_slide(self, direction):
+        """Slides and merges all rows at once, see _slide."""
+        rows = _orient(self.cells, direction).copy()
+        score_increase = int(_slide_left(rows).sum())
+        new_cells = np.empty_like(self.cells)
+        _orient(new_cells, direction)[...] = rows
+        return new_cells, score_increase, not np.array_equal(new_cells, self.cells)
+
+    def _can_move(self, cells=None):
+        """Checks if any moves are possible."""
+        if cells is None:
+            cells = self.cells
+        if not cells.all():
+            return True # Can always add a tile if empty cells exist
+        return bool((cells[:, :-1] == cells[:, 1:]).any() or (cells[:-1, :] == cells[1:, :]).any())
+
+    def move(self, direction):
+        """
+        Performs a move in the specified direction ('up', 'down', 'left', 'right').
+        Returns True if the board changed, False otherwise.
+        """
+        if self.game_over or direction not in DIRECTIONS:
+            return False
+
+        new_cells, score_increase, moved = self._slide(direction)
+        if moved:
+            self.cells = new_cells
+            self.score += score_increase
+            self._add_random_tile()
+            if not self._can_move():
+                self.game_over = True
+        return moved
+
+    def try_move(self, direction):
+        """
+        Simulates a move in the specified direction without changing the actual game state.
+        Returns a dictionary with the simulated board state and whether the move was valid.
+        """
+        if self.game_over or direction not in DIRECTIONS:
+            return {
+                "valid": False,
+                "board": self.board,
+                "score": self.score,
+                "game_over": self.game_over
+            }
+
+        new_cells, score_increase, moved = self._slide(direction)
+        if not moved:
+            return {
+                "valid": False,
+                "board": _values(new_cells),
+                "score": self.score,
+                "game_over": self.game_over
+            }
+
+        # Spawn from a fork, so the game's own random sequence is not advanced
+        rng, self.rng = self.rng, self.rng.fork()
+        try:
+            self._add_random_tile(new_cells)
+        finally:
+            self.rng = rng
+        return {
+            "valid": True,
+            "board": _values(new_cells),
+            "score": self.score + score_increase,
+            "game_over": not self._can_move(new_cells)
+        }
+
+    def preview(self, direction):
+        """
+        Computes the post-slide board of a move without spawning a tile,
+        consuming random state or changing the game.
+        """
+        if self.game_over or direction not in DIRECTIONS:
+            new_cells, score_increase, moved = self.cells, 0, False
+        else:
+            new_cells, score_increase, moved = self._slide(direction)
+        return {
+            "valid": moved,
+            "board": _values(new_cells),
+            "score": self.score + score_increase,
+            "score_delta": score_increase
+        }
+
+    def preview_all(self):
+        """Previews all four directions at once, keyed by direction."""
+        return {direction: self.preview(direction) for direction in DIRECTIONS}
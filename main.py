@@ -1,14 +1,90 @@
+import argparse
+import logging
 import threading
-import tkinter as tk
 import os
-from gui import GameGUI
-from api import run_api, set_gui_update_callback
-import game_manager
+import signal
+import sys
+from api import SERVERS, run_api, set_gui_update_callback, stop_api
+import metrics
+
+# Tk and the GUI are imported only when the window is shown, so headless
+# workers never load them and start as quickly as possible.
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="2048 game with a RESTful API for AI control")
+    parser.add_argument("--headless", action="store_true",
+                        help="run only the API (and the MCP server with --mcp), without the Tk window")
+    parser.add_argument("--mcp", action="store_true",
+                        help="with --headless, also serve the MCP tools over stdio, playing the same games as the API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--solver-workers", type=int, default=0,
+                        help="worker processes for the /suggest expectimax search (0 searches in the API thread)")
+    parser.add_argument("--server", choices=SERVERS, default="werkzeug",
+                        help="HTTP server for the API: Flask's development server or waitress for production use")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="request worker threads for the waitress server")
+    parser.add_argument("--metrics", action="store_true",
+                        help="collect request, lock and engine timings, served at /metrics")
+    parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"],
+                        help="'debug' logs every move")
+    args = parser.parse_args()
+    if args.mcp and not args.headless:
+        parser.error("--mcp requires --headless")
+    return args
+
+def print_endpoints(host, port, file=sys.stdout):
+    print(f"Access the API at http://{host}:{port}", file=file)
+    print("API Endpoints:", file=file)
+    print("  GET /status", file=file)
+    print("  POST /move/{up|down|left|right}", file=file)
+    print("  POST /moves  {\"directions\": [...], \"stop_on_game_over\": true}", file=file)
+    print("  POST /try_move/{up|down|left|right}", file=file)
+    print("  POST /try_move_all", file=file)
+    print("  GET /suggest?depth=3&time_limit=0.5", file=file)
+    print("  POST /reset", file=file)
+    print("  POST /undo, POST /redo, POST /snapshot, POST /restore/{snapshot_id}", file=file)
+    print("  GET /events?game_id=default  (server-sent events)", file=file)
+    print("  POST /games, GET /games, DELETE /games/{id}", file=file)
+    print("  GET /metrics  (with --metrics)", file=file)
+    print("  /games/{id}/{status|move|try_move|try_move_all|suggest|reset|undo|redo|snapshot|restore}", file=file)
+
+def api_kwargs(args):
+    return {
+        'host': args.host, 'port': args.port, 'solver_workers': args.solver_workers,
+        'server': args.server, 'threads': args.threads}
+
+def run_headless(args):
+    """Runs the API as the primary process, plus the MCP server over stdio with --mcp."""
+    if args.mcp:
+        # stdout carries the MCP protocol, so everything else goes to stderr
+        import mcp_server
+        mcp_server.MCP_MODE = "inprocess"
+        api_thread = threading.Thread(target=run_api, kwargs=api_kwargs(args), daemon=True)
+        api_thread.start()
+        print_endpoints(args.host, args.port, file=sys.stderr)
+        try:
+            mcp_server.mcp.run()
+        finally:
+            stop_api()
+        return
+
+    # Stop gracefully on SIGTERM as well as Ctrl+C; stop_api waits for the
+    # server loop, which runs in this thread, so it is called from another one
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=stop_api).start())
+    print_endpoints(args.host, args.port)
+    try:
+        run_api(**api_kwargs(args))
+    except KeyboardInterrupt:
+        stop_api()
+
+def run_with_gui(args):
+    import tkinter as tk
+    from gui import GameGUI
 
-def main():
     # Create the Tkinter root window and GUI instance
     root = tk.Tk()
-    
+
     # Set window icon
     icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "2048_icon.ico")
     if os.path.exists(icon_path):
@@ -16,7 +92,7 @@ def main():
             root.iconbitmap(icon_path)
         except Exception as e:
             print(f"Failed to set icon: {e}")
-    
+
     gui = GameGUI(master=root)
 
     # --- Crucial Link: Connect API changes to GUI ---
@@ -28,19 +104,30 @@ def main():
 
     # --- Start the API server in a separate thread ---
     # Use a daemon thread so it exits when the main program (GUI) exits.
-    api_thread = threading.Thread(target=run_api, kwargs={'host': '127.0.0.1', 'port': 5000}, daemon=True)
+    api_thread = threading.Thread(target=run_api, kwargs=api_kwargs(args), daemon=True)
     api_thread.start()
 
     print("GUI and API server starting...")
-    print("Access the API at http://127.0.0.1:5000")
-    print("API Endpoints:")
-    print("  GET /status")
-    print("  POST /move/{up|down|left|right}")
-    print("  POST /try_move/{up|down|left|right}")
-    print("  POST /reset")
+    print_endpoints(args.host, args.port)
+
+    # Shut the API down gracefully when the window is closed
+    def on_close():
+        stop_api()
+        root.destroy()
+    root.protocol("WM_DELETE_WINDOW", on_close)
 
     # --- Start the Tkinter main loop (must be in the main thread) ---
     root.mainloop()
 
+def main():
+    args = parse_args()
+    logging.getLogger().setLevel(args.log_level.upper())
+    if args.metrics:
+        metrics.enable()
+    if args.headless:
+        run_headless(args)
+    else:
+        run_with_gui(args)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
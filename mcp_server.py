@@ -1,106 +1,223 @@
 from fastmcp import FastMCP
+from requests.adapters import HTTPAdapter
+import argparse
+import asyncio
+import httpx
 import requests
 import json
+import os
+import wire
 
 mcp  = FastMCP("this is a 2048 game mcp server with max of 32768, you can play it")
 
 
 BASE_API = "http://127.0.0.1:5000"
 
+# "http" forwards every tool call to the game API at BASE_API (the GUI process).
+# "inprocess" runs the games inside this process through game_service, with the
+# same session locks and the same responses, but no HTTP hop and no GUI.
+# Set with the GAME_MCP_MODE environment variable or the --in-process flag.
+MCP_MODE = os.environ.get("GAME_MCP_MODE", "http")
 
-def move(direction:str)-> str:
-    rsp = requests.post(f"{BASE_API}/move/{direction}")
-    if rsp.status_code == 200:
-        jsonrsp = rsp.json()
-        jsonrsp['request_result'] = 'ok'
-        return json.dumps(jsonrsp)
+# With TERSE on, tool results carry every board as one string of rows, e.g. "2 0 0 4/0 8 2 0/...",
+# in compact JSON, which costs an agent far fewer tokens than nested lists.
+# Set with the GAME_MCP_TERSE environment variable or the --terse flag.
+TERSE = os.environ.get("GAME_MCP_TERSE", "") not in ("", "0")
+
+# Every call to the game API goes through one of two shared keep-alive clients,
+# so connections are reused instead of opened per tool call.
+POOL_SIZE = 32
+CONNECT_TIMEOUT = 2.0 # seconds
+READ_TIMEOUT = 30.0 # seconds; /suggest searches can take a while
+
+# Blocking client for the plain helper functions
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+
+# Async client for the MCP tools, created on first use inside the server's event loop
+_async_client = None
+
+
+def _format_body(body, status_code) -> str:
+    """Adds the request result to an API response body and returns it as a JSON string."""
+    if status_code == 200:
+        body['request_result'] = 'ok'
     else:
-        jsonrsp = rsp.json()
-        jsonrsp['request_result'] = f"fail with http {rsp.status_code}"
-        return json.dumps(jsonrsp)
-    
+        body['request_result'] = f"fail with http {status_code}"
+    # Same key order as the API's JSON responses
+    if TERSE:
+        return json.dumps(wire.transform_boards(body, wire.terse_board), sort_keys=True, separators=(',', ':'))
+    return json.dumps(body, sort_keys=True)
+
+
+def _format_response(rsp) -> str:
+    """Adds the request result to the API's JSON body and returns it as a string."""
+    return _format_body(rsp.json(), rsp.status_code)
+
+
+def _request(method: str, path: str, **kwargs) -> str:
+    """Calls the game API through the pooled blocking session."""
+    rsp = _session.request(method, f"{BASE_API}{path}", timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+    return _format_response(rsp)
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            base_url=BASE_API,
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+    return _async_client
+
+
+async def _request_async(method: str, path: str, **kwargs) -> str:
+    """Calls the game API through the pooled async client without blocking the event loop."""
+    rsp = await _get_async_client().request(method, path, **kwargs)
+    return _format_response(rsp)
+
+
+def _service():
+    """Imports the game service on first use, so HTTP mode never loads the engines."""
+    import game_service
+    return game_service
+
+
+async def _call(method: str, path: str, local_call, **kwargs) -> str:
+    """
+    Runs a tool call in-process or over HTTP depending on MCP_MODE.
+    local_call returns game_service's (body, status_code). It runs on a worker thread,
+    since it can wait on a session lock held by the API or by a long search.
+    """
+    if MCP_MODE == "inprocess":
+        body, status_code = await asyncio.to_thread(local_call)
+        return _format_body(body, status_code)
+    return await _request_async(method, path, **kwargs)
+
+
+def move(direction:str)-> str:
+    if MCP_MODE == "inprocess":
+        return _format_body(*_service().move(direction))
+    return _request("POST", f"/move/{direction}")
+
 
 def try_move(direction:str)-> str:
-    rsp = requests.post(f"{BASE_API}/try_move/{direction}")
-    if rsp.status_code == 200:
-        jsonrsp = rsp.json()
-        jsonrsp['request_result'] = 'ok'
-        return json.dumps(jsonrsp)
-    else:
-        jsonrsp = rsp.json()
-        jsonrsp['request_result'] = f"fail with http {rsp.status_code}"
-        return json.dumps(jsonrsp)
+    if MCP_MODE == "inprocess":
+        return _format_body(*_service().try_move(direction))
+    return _request("POST", f"/try_move/{direction}")
+
+
+async def move_async(direction:str)-> str:
+    return await _call("POST", f"/move/{direction}", lambda: _service().move(direction))
+
+
+async def try_move_async(direction:str)-> str:
+    return await _call("POST", f"/try_move/{direction}", lambda: _service().try_move(direction))
 
 @mcp.tool()
-def moveup() -> str:
+async def moveup() -> str:
     """move up a 2048 game's direction and get current status"""
-    return move('up')
+    return await move_async('up')
 
 @mcp.tool()
-def movedown() -> str:
+async def movedown() -> str:
     """move down a 2048 game's direction and get current status"""
-    return move('down')
+    return await move_async('down')
 
 @mcp.tool()
-def moveleft() -> str:
+async def moveleft() -> str:
     """move left a 2048 game's direction and get current status"""
-    return move('left')
+    return await move_async('left')
 
 @mcp.tool()
-def moveright() -> str:
+async def moveright() -> str:
     """move right a 2048 game's direction and get current status"""
-    return move('right')
+    return await move_async('right')
+
 
 
+@mcp.tool()
+async def move_sequence(directions: list[str], stop_on_game_over: bool = True) -> str:
+    """apply a list of moves (each up, down, left or right) to a 2048 game in one call; returns whether each move changed the board, its score gain and the final status. stops at game over unless stop_on_game_over is false"""
+    return await _call("POST", "/moves", lambda: _service().moves(directions, stop_on_game_over),
+                       json={"directions": directions, "stop_on_game_over": stop_on_game_over})
+
+@mcp.tool()
+async def try_move_all() -> str:
+    """preview all four directions of a 2048 game at once, returning the board and score after each slide (before the new tile appears) without affecting the real game"""
+    return await _call("POST", "/try_move_all", lambda: _service().try_move_all())
+
+@mcp.tool()
+async def suggest_move(depth: int = 3, time_limit: float = 0) -> str:
+    """suggest the best direction for the current 2048 board using an expectimax search, with its expected value. depth is the search depth in moves (1-8), time_limit a budget in seconds (0 for none, allowed only up to depth 5)"""
+    params = {"depth": depth}
+    if time_limit:
+        params["time_limit"] = time_limit
+    return await _call("GET", "/suggest", lambda: _service().suggest(depth, time_limit or None), params=params)
 
-# # try move 
+@mcp.tool()
+async def undo() -> str:
+    """undo the last move (or snapshot restore) of a 2048 game and get the current status; can be repeated to go further back"""
+    return await _call("POST", "/undo", lambda: _service().undo())
+
+@mcp.tool()
+async def redo() -> str:
+    """redo the last undone move of a 2048 game and get the current status"""
+    return await _call("POST", "/redo", lambda: _service().redo())
+
+@mcp.tool()
+async def snapshot() -> str:
+    """save the current 2048 game state and get a snapshot_id to return to it later with restore_snapshot, e.g. to backtrack after exploring moves"""
+    return await _call("POST", "/snapshot", lambda: _service().snapshot())
+
+@mcp.tool()
+async def restore_snapshot(snapshot_id: int) -> str:
+    """put a 2048 game back into a state saved with snapshot and get the current status"""
+    return await _call("POST", f"/restore/{snapshot_id}", lambda: _service().restore(snapshot_id))
+
+# # try move
 # @mcp.tool()
-# def try_moveup() -> str:
+# async def try_moveup() -> str:
 #     """try to move up a 2048 game's direction and get status after moving but not affect real game"""
-#     return try_move('up')
+#     return await try_move_async('up')
 
 # @mcp.tool()
-# def try_movedown() -> str:
+# async def try_movedown() -> str:
 #     """try to move down a 2048 game's direction and get status after moving but not affect real game"""
-#     return try_move('down')
+#     return await try_move_async('down')
 
 # @mcp.tool()
-# def try_moveleft() -> str:
+# async def try_moveleft() -> str:
 #     """try to move left a 2048 game's direction and get status after moving but not affect real game"""
-#     return try_move('left')
+#     return await try_move_async('left')
 
 # @mcp.tool()
-# def try_moveright() -> str:
+# async def try_moveright() -> str:
 #     """try to move right a 2048 game's direction and get status after moving but not affect real game"""
-#     return try_move('right')
+#     return await try_move_async('right')
+
 
-    
 @mcp.tool()
-def get_status() -> str:
+async def get_status() -> str:
     """get 2048 game status of all the tiles and current score in json format"""
-    rsp = requests.get(f"{BASE_API}/status")
-    if rsp.status_code == 200:
-        jsonrsp = rsp.json()
-        jsonrsp['request_result'] = 'ok'
-        return json.dumps(jsonrsp)
-    else:
-        jsonrsp = rsp.json()
-        jsonrsp['request_result'] = f"fail with http {rsp.status_code}"
-        return json.dumps(jsonrsp)
+    return await _call("GET", "/status", lambda: _service().get_status())
 
 # @mcp.tool()
-# def reset_game() -> str:
+# async def reset_game() -> str:
 #     """reset 2048 game status"""
-#     rsp = requests.post(f"{BASE_API}/reset")
-#     if rsp.status_code == 200:
-#         jsonrsp = rsp.json()
-#         jsonrsp['request_result'] = 'ok'
-#         return json.dumps(jsonrsp)
-#     else:
-#         jsonrsp = rsp.json()
-#         jsonrsp['request_result'] = f"fail with http {rsp.status_code}"
-#         return json.dumps(jsonrsp)
+#     return await _call("POST", "/reset", lambda: _service().reset_game())
 
 
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="2048 game MCP server")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run the game inside the MCP server instead of calling the API at BASE_API")
+    parser.add_argument("--terse", action="store_true",
+                        help="return boards as compact row strings instead of nested JSON lists")
+    args = parser.parse_args()
+    if args.in_process:
+        MCP_MODE = "inprocess"
+    if args.terse:
+        TERSE = True
+    mcp.run()
@@ -0,0 +1,219 @@
+"""
+Opt-in instrumentation: counters and latency histograms rendered in the
+Prometheus text format by the API's /metrics route.
+
+Nothing is measured until enable() is called (main.py --metrics), so the
+hot paths pay only an `if metrics.enabled` check, and the engines pay
+nothing: enable() wraps their phase methods with timers.
+"""
+import bisect
+import functools
+import threading
+import time
+
+# Upper bounds, in seconds, of the histogram buckets: 10us .. 5s
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                   0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+enabled = False
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum and count, per label combination."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *label_values):
+        """A context manager that observes the time spent inside it."""
+        return _Timer(self, label_values)
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, [('le', le)])} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label_values', 'start')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+
+class _TimedLock:
+    """Acquires a lock and observes how long the acquisition waited."""
+
+    __slots__ = ('lock', 'label_values')
+
+    def __init__(self, lock, label_values):
+        self.lock = lock
+        self.label_values = label_values
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        LOCK_WAIT.observe(time.perf_counter() - start, *self.label_values)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+
+def timed_lock(lock, *label_values):
+    """Returns a context manager for the lock that records its wait time in LOCK_WAIT."""
+    return _TimedLock(lock, label_values)
+
+
+# --- Metrics ---
+
+REQUESTS = Counter("game_requests_total", "API requests handled", ("route", "method", "status"))
+REQUEST_SECONDS = Histogram("game_request_seconds", "API request latency", ("route", "method"))
+LOCK_WAIT = Histogram("game_lock_wait_seconds", "Time spent waiting for a game session lock", ("game",))
+ENGINE_PHASE = Histogram("game_engine_phase_seconds",
+                         "Time spent in each phase of the game engines", ("engine", "phase"))
+JSON_SECONDS = Histogram("game_json_seconds", "Time spent serializing API responses to JSON")
+GUI_CALLBACK = Histogram("game_gui_callback_seconds", "Time spent in the GUI update callback")
+
+ALL = (REQUESTS, REQUEST_SECONDS, LOCK_WAIT, ENGINE_PHASE, JSON_SECONDS, GUI_CALLBACK)
+
+# Engine methods timed as phases: the whole move, the slide and merge, the tile spawn and the game over check
+ENGINE_PHASES = {'move': 'move', '_slide': 'slide', '_add_random_tile': 'spawn', '_can_move': 'can_move'}
+
+
+def _timed_method(method, engine, phase):
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            ENGINE_PHASE.observe(time.perf_counter() - start, engine, phase)
+    timed.untimed = method
+    return timed
+
+
+def _instrument_engines():
+    from game_logic import GameLogic
+    from bitboard import BitboardGame
+    from large_board import LargeBoardGame
+    for engine, cls in (("list", GameLogic), ("bitboard", BitboardGame), ("numpy", LargeBoardGame)):
+        for method_name, phase in ENGINE_PHASES.items():
+            method = cls.__dict__.get(method_name)
+            if method is not None and not hasattr(method, "untimed"):
+                setattr(cls, method_name, _timed_method(method, engine, phase))
+
+
+def enable():
+    """Starts collecting metrics."""
+    global enabled
+    if not enabled:
+        _instrument_engines()
+        enabled = True
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in ALL:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    lines.extend(_move_cache_samples())
+    lines.extend(_line_memo_samples())
+    return "\n".join(lines) + "\n"
+
+
+def _move_cache_samples():
+    """The shared move cache's statistics, which it keeps whether or not metrics are enabled."""
+    import move_cache
+    stats = move_cache.cache.stats()
+    for name, kind, help in (("hits", "counter", "Move cache lookups that found the slide result"),
+                             ("misses", "counter", "Move cache lookups that had to compute the slide"),
+                             ("evictions", "counter", "Move cache entries evicted to stay within its cell bound"),
+                             ("entries", "gauge", "Slide results held by the move cache"),
+                             ("cells", "gauge", "Board cells held by the move cache")):
+        metric = f"game_move_cache_{name}" + ("_total" if kind == "counter" else "")
+        yield f"# HELP {metric} {help}"
+        yield f"# TYPE {metric} {kind}"
+        yield f"{metric} {stats[name]}"
+
+
+def _line_memo_samples():
+    """The list engine's merged-line memo statistics (see game_logic.py), also kept whether or not metrics are enabled."""
+    import game_logic
+    stats = game_logic.merged_lines_stats()
+    for name, kind, help in (("hits", "counter", "Line slides found in the list engine's memo"),
+                             ("misses", "counter", "Line slides the list engine had to compute"),
+                             ("clears", "counter", "Times the list engine's line memo was emptied at its limit"),
+                             ("entries", "gauge", "Lines held by the list engine's memo")):
+        metric = f"game_line_memo_{name}" + ("_total" if kind == "counter" else "")
+        yield f"# HELP {metric} {help}"
+        yield f"# TYPE {metric} {kind}"
+        yield f"{metric} {stats[name]}"
@@ -0,0 +1,98 @@
+"""
+A process-wide LRU cache of slide results, shared by every game session.
+
+Sliding is deterministic: the same board slid in the same direction always gives
+the same board, score increase and moved flag, and only the spawned tile is random.
+Agents and solvers revisit positions constantly (try_move or try_move_all and then
+the real move), so the numpy engine looks its slides up here first, where a hit
+costs a few microseconds instead of a full vectorized slide.
+
+The list engine memoizes single merged lines instead (see game_logic.py), which
+hit far more often than whole boards and are cheaper to look up than a board key
+is to build. The bitboard engine and the solver use precomputed row tables.
+"""
+from collections import OrderedDict
+import threading
+
+# Total board cells the cache may hold, so that a few large boards cannot crowd out memory
+CACHE_CELLS = 1 << 20
+
+
+class MoveCache:
+    """
+    An LRU mapping of (board key, direction) to a slide result, bounded by the
+    total number of board cells in its entries. Counts hits, misses and evictions.
+    """
+
+    __slots__ = ('max_cells', 'cells', '_entries', '_lock', 'hits', 'misses', 'evictions')
+
+    def __init__(self, max_cells=CACHE_CELLS):
+        self.max_cells = max_cells
+        self.cells = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached result for key, or None, and marks it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result, cells):
+        """Caches a result that holds `cells` board cells, evicting the least recently used entries beyond max_cells."""
+        if cells > self.max_cells:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.cells -= old[1]
+            self._entries[key] = (result, cells)
+            self.cells += cells
+            while self.cells > self.max_cells:
+                _, (_, evicted_cells) = self._entries.popitem(last=False)
+                self.cells -= evicted_cells
+                self.evictions += 1
+
+    def resize(self, max_cells):
+        """Changes the bound, evicting entries as needed. 0 disables the cache."""
+        with self._lock:
+            self.max_cells = max_cells
+            while self.cells > max_cells:
+                _, (_, evicted_cells) = self._entries.popitem(last=False)
+                self.cells -= evicted_cells
+                self.evictions += 1
+
+    def clear(self):
+        """Empties the cache and resets its statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.cells = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Returns the entry and cell counts, hits, misses, evictions and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "cells": self.cells,
+                "max_cells": self.max_cells,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+cache = MoveCache()
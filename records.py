@@ -0,0 +1,274 @@
+"""
+Compact binary game records, stored in an append-only log that can be memory-mapped.
+
+A record is a fixed header followed by the moves and the spawned tiles:
+
+    header  seed (u64), size (u8), flags (u8, bit 0 = game over),
+            move count (u32), final score (u64), all little-endian
+    moves   2 bits per move, four moves per byte, lowest bits first
+            (0 = up, 1 = down, 2 = left, 3 = right)
+    spawns  u16 per tile, cell index (row * size + col) << 1 | (1 if 4 else 0):
+            the two initial tiles, then one per move
+
+Only moves that changed the board are recorded, and each of them spawned
+exactly one tile, so a game of N moves takes 22 + N/4 + 2 * (N + 2) bytes.
+
+A log is a data file that starts with LOG_MAGIC and holds records back to
+back, plus an index file (<path>.idx) of the u64 offset of every record.
+The index is written after the record, so readers only see complete records.
+
+    python records.py info games.g2r
+    python records.py show games.g2r 12 --move 100 --verify
+"""
+import argparse
+import mmap
+import os
+import struct
+
+from game_logic import DIRECTIONS, GameLogic
+
+LOG_MAGIC = b"2048REC\x01"
+RECORD_HEADER = struct.Struct("<QBBIQ")
+INDEX_ENTRY = struct.Struct("<Q")
+SPAWN = struct.Struct("<H")
+
+FLAG_GAME_OVER = 1
+
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+class GameRecord:
+    """One game: its seed and size, the direction codes played and the tiles spawned as (cell, value)."""
+
+    __slots__ = ('seed', 'size', 'score', 'game_over', 'moves', 'spawns')
+
+    def __init__(self, seed, size, moves=None, spawns=None, score=0, game_over=False):
+        self.seed = seed
+        self.size = size
+        self.moves = moves if moves is not None else []
+        self.spawns = spawns if spawns is not None else []
+        self.score = score
+        self.game_over = game_over
+
+    @property
+    def directions(self):
+        return [DIRECTIONS[code] for code in self.moves]
+
+    def encode(self):
+        """Returns the record as bytes."""
+        if not 0 <= self.seed < 1 << 64:
+            raise ValueError("Only seeds in [0, 2**64) can be recorded")
+        if len(self.spawns) != len(self.moves) + 2:
+            raise ValueError("A record needs two initial spawns plus one per move")
+
+        flags = FLAG_GAME_OVER if self.game_over else 0
+        moves = bytearray((len(self.moves) + 3) // 4)
+        for i, code in enumerate(self.moves):
+            moves[i >> 2] |= code << (2 * (i & 3))
+        spawns = bytearray(SPAWN.size * len(self.spawns))
+        for i, (cell, value) in enumerate(self.spawns):
+            SPAWN.pack_into(spawns, SPAWN.size * i, cell << 1 | (value == 4))
+        header = RECORD_HEADER.pack(self.seed, self.size, flags, len(self.moves), self.score)
+        return header + bytes(moves) + bytes(spawns)
+
+    @classmethod
+    def decode(cls, buffer, offset=0):
+        """Reads the record at offset in any bytes-like buffer. Returns (record, offset after it)."""
+        seed, size, flags, count, score = RECORD_HEADER.unpack_from(buffer, offset)
+        offset += RECORD_HEADER.size
+        packed = buffer[offset:offset + (count + 3) // 4]
+        moves = [(packed[i >> 2] >> (2 * (i & 3))) & 3 for i in range(count)]
+        offset += len(packed)
+        spawns = []
+        for _ in range(count + 2):
+            (value,) = SPAWN.unpack_from(buffer, offset)
+            spawns.append((value >> 1, 4 if value & 1 else 2))
+            offset += SPAWN.size
+        return cls(seed, size, moves, spawns, score, bool(flags & FLAG_GAME_OVER)), offset
+
+    def replay(self, move_number=None):
+        """Rebuilds the game after move_number moves (all of them by default) through GameLogic."""
+        if move_number is None:
+            move_number = len(self.moves)
+        if not 0 <= move_number <= len(self.moves):
+            raise IndexError(f"Move {move_number} out of range 0..{len(self.moves)}")
+
+        size = self.size
+        board = [[0] * size for _ in range(size)]
+        for cell, value in self.spawns[:2]:
+            board[cell // size][cell % size] = value
+        game = GameLogic.from_status({"board": board, "score": 0, "game_over": False,
+                                      "size": size, "seed": self.seed})
+        for code, (cell, value) in zip(self.moves[:move_number], self.spawns[2:]):
+            if not game.apply_move(DIRECTIONS[code], (cell // size, cell % size, value)):
+                raise ValueError(f"Recorded move {DIRECTIONS[code]} does not change the board")
+        return game
+
+    def verify(self):
+        """Checks that the seed reproduces the recorded game."""
+        expected = self.replay()
+        actual = GameLogic.replay(self.seed, self.directions, size=self.size)
+        return actual.board == expected.board and actual.score == expected.score == self.score
+
+    def __len__(self):
+        return len(self.moves)
+
+
+class GameRecorder:
+    """
+    Plays a game and records it. Works with either engine: the spawned tile of
+    each move is found by comparing the board with the move's preview.
+    """
+
+    def __init__(self, game):
+        size = game.size
+        spawns = [(r * size + c, value) for r, row in enumerate(game.board) for c, value in enumerate(row) if value]
+        if len(spawns) != 2 or game.score:
+            raise ValueError("Recording must start from a new game")
+        self.game = game
+        self.record = GameRecord(game.seed, size, spawns=spawns)
+
+    def move(self, direction):
+        """Performs a move on the game and records it if it changed the board."""
+        before = self.game.preview(direction)["board"]
+        moved = self.game.move(direction)
+        if moved:
+            size = self.game.size
+            board = self.game.board
+            cell = next(r * size + c for r in range(size) for c in range(size) if board[r][c] != before[r][c])
+            self.record.moves.append(DIRECTION_CODES[direction])
+            self.record.spawns.append((cell, board[cell // size][cell % size]))
+            self.record.score = self.game.score
+            self.record.game_over = self.game.game_over
+        return moved
+
+
+class RecordLog:
+    """Appends records to a log and its index. Not safe for several writers at once."""
+
+    def __init__(self, path):
+        self.path = path
+        self._data = open(path, "ab")
+        if self._data.tell() == 0:
+            self._data.write(LOG_MAGIC)
+        self._index = open(index_path(path), "ab")
+
+    def append(self, record):
+        """Writes a GameRecord and returns its number in the log."""
+        offset = self._data.tell()
+        self._data.write(record.encode())
+        self._data.flush()
+        self._index.write(INDEX_ENTRY.pack(offset))
+        self._index.flush()
+        return self._index.tell() // INDEX_ENTRY.size - 1
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _map(path):
+    """Memory-maps a file read-only, or returns empty bytes for an empty file."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class RecordReader:
+    """
+    Random access to the records of a log through memory maps of the data and index files.
+    Records appended after opening are not seen until the log is opened again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = _map(path)
+        if self._data[:len(LOG_MAGIC)] != LOG_MAGIC:
+            self.close()
+            raise ValueError(f"Not a game record log: {path}")
+        self._index = _map(index_path(path))
+        self._count = len(self._index) // INDEX_ENTRY.size
+
+    def __len__(self):
+        return self._count
+
+    def offset(self, number):
+        if not 0 <= number < self._count:
+            raise IndexError(f"Record {number} out of range")
+        return INDEX_ENTRY.unpack_from(self._index, INDEX_ENTRY.size * number)[0]
+
+    def header(self, number):
+        """Reads only a record's header, as a dictionary, without decoding its moves."""
+        seed, size, flags, moves, score = RECORD_HEADER.unpack_from(self._data, self.offset(number))
+        return {"seed": seed, "size": size, "game_over": bool(flags & FLAG_GAME_OVER),
+                "moves": moves, "score": score}
+
+    def headers(self):
+        for number in range(self._count):
+            yield self.header(number)
+
+    def __getitem__(self, number):
+        return GameRecord.decode(self._data, self.offset(number))[0]
+
+    def __iter__(self):
+        for number in range(self._count):
+            yield self[number]
+
+    def close(self):
+        for mapped in (self._data, getattr(self, "_index", b"")):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay 2048 game record logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="summarize every game in a log")
+    info.add_argument("path")
+    show = commands.add_parser("show", help="print a game's board after a given move")
+    show.add_argument("path")
+    show.add_argument("number", type=int, help="record number in the log")
+    show.add_argument("--move", type=int, help="move number (default: the end of the game)")
+    show.add_argument("--verify", action="store_true", help="also check that the seed reproduces the game")
+    args = parser.parse_args()
+
+    with RecordReader(args.path) as reader:
+        if args.command == "info":
+            games = moves = best = 0
+            for header in reader.headers():
+                games += 1
+                moves += header["moves"]
+                best = max(best, header["score"])
+            print(f"{games} games, {moves} moves, best score {best}")
+            return
+
+        record = reader[args.number]
+        game = record.replay(args.move)
+        move = len(record) if args.move is None else args.move
+        print(f"Game {args.number}: seed {record.seed}, size {record.size}, move {move} of {len(record)}")
+        for row in game.board:
+            print(row)
+        print(f"Score: {game.score}")
+        if args.verify:
+            print("Seed reproduces the game" if record.verify() else "Seed does NOT reproduce the game")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import random
+
+MASK64 = (1 << 64) - 1
+
+
+def new_seed():
+    """Picks a seed for a game created without one. Uses the global random module, so random.seed() still applies."""
+    return random.getrandbits(32)
+
+
+class GameRandom:
+    """
+    The random generator owned by one game (splitmix64).
+    Its whole state is a single 64-bit integer, so it is cheap to fork, pack
+    and restore, and a game can be replayed from its seed and its moves alone.
+    """
+
+    __slots__ = ('seed', 'state')
+
+    def __init__(self, seed=None, state=None):
+        self.seed = new_seed() if seed is None else seed
+        self.state = self.seed & MASK64 if state is None else state
+
+    def _next(self):
+        self.state = z = (self.state + 0x9E3779B97F4A7C15) & MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+        return z ^ (z >> 31)
+
+    def random(self):
+        """Returns a float in [0, 1)."""
+        return (self._next() >> 11) * (1.0 / (1 << 53))
+
+    def randrange(self, n):
+        """Returns an integer in [0, n)."""
+        return (self._next() * n) >> 64
+
+    def choice(self, seq):
+        """Returns a random element of a non-empty sequence."""
+        return seq[self.randrange(len(seq))]
+
+    def fork(self):
+        """Returns an independent copy that continues from the current state."""
+        return GameRandom(self.seed, self.state)
+
+    def __repr__(self):
+        return f"GameRandom(seed={self.seed}, state={self.state})"
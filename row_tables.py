@@ -0,0 +1,189 @@
+"""
+Precomputed left-slide results for every row of a board size, stored in files that
+are memory-mapped, so processes share one copy and start without rebuilding.
+
+A table covers all rows whose tiles have exponents below its exponent count
+(exponents 0..16 cover tiles up to 65536, 0 being an empty cell):
+
+    header   magic, size (u8), exponent count (u8), row count (u32)
+    results  size bytes per row: the tile exponents after sliding left
+    scores   u32 per row: the score of the slide
+
+Rows are numbered by reading their exponents as the digits of a base-(exponent count)
+number, first cell most significant. Tables are kept as rows-<size>.tbl in TABLE_DIR
+(the GAME_TABLE_DIR environment variable, by default ~/.cache/game2048), and
+GameLogic looks its lines up there when a table for its size exists.
+
+    python row_tables.py build 5 6
+    python row_tables.py info
+"""
+import argparse
+import mmap
+import os
+import struct
+
+TABLE_MAGIC = b"2048ROW\x01"
+TABLE_HEADER = struct.Struct("<8sBBxxI")
+SCORE = struct.Struct("<I")
+
+TABLE_DIR = os.environ.get("GAME_TABLE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "game2048")
+
+# Bounds on the tables built by default: at most 4M rows, and tiles up to 65536.
+# Size 5 gets the full 17 exponents (13 MB), size 6 tiles up to 2048 (30 MB).
+MAX_ROWS = 1 << 22
+MAX_EXPONENTS = 17
+
+# Rows generated at a time while building, to bound memory use
+BUILD_CHUNK = 1 << 18
+
+
+def table_path(size, directory=None):
+    return os.path.join(directory or TABLE_DIR, f"rows-{size}.tbl")
+
+
+def default_exponents(size, max_rows=MAX_ROWS):
+    """The largest exponent count, up to MAX_EXPONENTS, whose table for the size has at most max_rows rows."""
+    exponents = MAX_EXPONENTS
+    while exponents > 2 and exponents ** size > max_rows:
+        exponents -= 1
+    return exponents
+
+
+class RowTable:
+    """A read-only, memory-mapped row table. Raises ValueError for a file that is not a valid table."""
+
+    __slots__ = ('path', 'size', 'exponents', 'rows', '_map', '_scores', '_exponent_of', '_value_of')
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.size, self.exponents, self.rows = TABLE_HEADER.unpack_from(self._map)
+        except struct.error:
+            magic = None
+        if magic != TABLE_MAGIC:
+            self.close()
+            raise ValueError(f"Not a row table: {path}")
+        self._scores = TABLE_HEADER.size + self.rows * self.size
+        if self.rows != self.exponents ** self.size or len(self._map) != self._scores + self.rows * SCORE.size:
+            self.close()
+            raise ValueError(f"Truncated or inconsistent row table: {path}")
+        # Tile value to exponent for the tiles the table covers, and exponent to value
+        # up to one past them, since the largest tiles can merge
+        self._exponent_of = {0: 0, **{1 << e: e for e in range(1, self.exponents)}}
+        self._value_of = (0,) + tuple(1 << e for e in range(1, self.exponents + 1))
+
+    def lookup(self, line):
+        """
+        Returns (new_line, score_increase) for sliding a line of tile values left,
+        or None if one of its tiles is beyond the table.
+        """
+        exponents = self.exponents
+        exponent_of = self._exponent_of
+        index = 0
+        for value in line:
+            exponent = exponent_of.get(value)
+            if exponent is None:
+                return None
+            index = index * exponents + exponent
+        start = TABLE_HEADER.size + index * self.size
+        value_of = self._value_of
+        new_line = tuple([value_of[e] for e in self._map[start:start + self.size]])
+        return new_line, SCORE.unpack_from(self._map, self._scores + index * SCORE.size)[0]
+
+    def close(self):
+        self._map.close()
+
+
+# Tables opened so far, by size; None for a size without a usable table
+_tables = {}
+
+
+def load(size):
+    """Returns the row table for a board size from TABLE_DIR, opened once per process, or None if there is none."""
+    if size not in _tables:
+        try:
+            table = RowTable(table_path(size))
+        except (OSError, ValueError):
+            table = None
+        if table is not None and table.size != size:
+            table.close()
+            table = None
+        _tables[size] = table
+    return _tables[size]
+
+
+def build(size, exponents=None, directory=None):
+    """
+    Computes the table for a board size and writes it to the table directory, returning its path.
+    The file is written under a temporary name and then renamed, so readers never see a partial table.
+    """
+    import numpy as np
+    from batch import _slide_left
+
+    if exponents is None:
+        exponents = default_exponents(size)
+    if not 2 <= exponents <= MAX_EXPONENTS:
+        raise ValueError(f"Exponent count must be between 2 and {MAX_EXPONENTS}, got {exponents}")
+    rows = exponents ** size
+    if rows >= 1 << 32:
+        raise ValueError(f"A size {size} table with {exponents} exponents is too large")
+
+    path = table_path(size, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    # Place values of the digits, first cell most significant
+    places = exponents ** np.arange(size - 1, -1, -1, dtype=np.int64)
+    scores = np.empty(rows, dtype="<u4")
+    try:
+        with open(temporary, "wb") as f:
+            f.write(TABLE_HEADER.pack(TABLE_MAGIC, size, exponents, rows))
+            for start in range(0, rows, BUILD_CHUNK):
+                index = np.arange(start, min(start + BUILD_CHUNK, rows), dtype=np.int64)
+                cells = ((index[:, None] // places) % exponents).astype(np.uint8)
+                scores[start:start + len(index)] = _slide_left(cells)
+                f.write(cells.tobytes())
+            f.write(scores.tobytes())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    _tables.pop(size, None)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect the precomputed row tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_command = commands.add_parser("build", help="build the tables for the given board sizes")
+    build_command.add_argument("sizes", type=int, nargs="+")
+    build_command.add_argument("--exponents", type=int,
+                               help=f"exponent count (default: the most that keeps a table within {MAX_ROWS} rows)")
+    info = commands.add_parser("info", help="list the tables in the table directory")
+    for command in (build_command, info):
+        command.add_argument("--dir", default=None, help=f"table directory (default: {TABLE_DIR})")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for size in args.sizes:
+            path = build(size, args.exponents, args.dir)
+            print(f"Built {path}")
+        return
+
+    directory = args.dir or TABLE_DIR
+    names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+    for name in names:
+        if name.startswith("rows-") and name.endswith(".tbl"):
+            try:
+                table = RowTable(os.path.join(directory, name))
+            except ValueError as error:
+                print(error)
+                continue
+            print(f"{name}: size {table.size}, tiles up to {1 << (table.exponents - 1)}, {table.rows} rows")
+            table.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from bitboard import (
+    DIRECTIONS, MAX_EXPONENT, ROW_MASK, SIZE, BitboardGame,
+    empty_cells, encode_board, move_state, transpose,
+)
+
+# --- Heuristics ---
+# A heuristic scores a single line of four tile exponents (index 0 is the
+# left/top end). Boards are scored by summing a heuristic over all rows and
+# all columns, so each one can be tabulated for every 16-bit row up front.
+
+def empty_heuristic(line):
+    """Counts empty cells; open boards leave room to manoeuvre."""
+    return sum(1 for e in line if e == 0)
+
+
+def merges_heuristic(line):
+    """Counts the merges available in a line, ignoring gaps between tiles."""
+    tiles = [e for e in line if e != 0]
+    return sum(1 for a, b in zip(tiles, tiles[1:]) if a == b)
+
+
+def monotonicity_heuristic(line):
+    """Penalizes lines that are not sorted, in whichever direction fits better."""
+    left = right = 0
+    for a, b in zip(line, line[1:]):
+        if a > b:
+            left += a ** 4 - b ** 4
+        else:
+            right += b ** 4 - a ** 4
+    return -min(left, right)
+
+
+def sum_heuristic(line):
+    """Penalizes large tiles that are still scattered across the board."""
+    return -sum(e ** 3.5 for e in line)
+
+
+HEURISTICS = {
+    "empty": empty_heuristic,
+    "merges": merges_heuristic,
+    "monotonicity": monotonicity_heuristic,
+    "sum": sum_heuristic,
+}
+
+DEFAULT_WEIGHTS = {
+    "empty": 270.0,
+    "merges": 700.0,
+    "monotonicity": 47.0,
+    "sum": 11.0,
+}
+
+_heuristic_tables = {}
+_row_score_tables = {}
+
+
+def register_heuristic(name, func):
+    """Registers a line heuristic under a name so it can be used in solver weights."""
+    HEURISTICS[name] = func
+    _heuristic_tables.pop(name, None)
+    _row_score_tables.clear()
+
+
+def _heuristic_table(name):
+    """Returns the 65536-entry row table for a heuristic, building it on first use."""
+    table = _heuristic_tables.get(name)
+    if table is None:
+        func = HEURISTICS[name]
+        table = [func([(row >> (4 * i)) & 0xF for i in range(SIZE)]) for row in range(65536)]
+        _heuristic_tables[name] = table
+    return table
+
+
+def _row_score_table(weights):
+    """Combines the weighted heuristic tables into a single row score table, cached per weighting."""
+    key = tuple(sorted(weights.items()))
+    row_scores = _row_score_tables.get(key)
+    if row_scores is None:
+        tables = [(weight, _heuristic_table(name)) for name, weight in key if weight]
+        row_scores = [sum(weight * table[row] for weight, table in tables) for row in range(65536)]
+        _row_score_tables[key] = row_scores
+    return row_scores
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget runs out."""
+
+
+class ExpectimaxSolver:
+    """
+    Expectimax search over packed 4x4 boards.
+    Max nodes pick a direction, chance nodes average over every possible new tile.
+    """
+
+    def __init__(self, depth=3, time_limit=None, prob_cutoff=0.0001, weights=None):
+        self.depth = depth
+        self.time_limit = time_limit
+        self.prob_cutoff = prob_cutoff
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        unknown = set(self.weights) - set(HEURISTICS)
+        if unknown:
+            raise ValueError(f"Unknown heuristics: {', '.join(sorted(unknown))}")
+        self._row_scores = _row_score_table(self.weights)
+        # Value of a board with no legal move, below anything evaluate() can return
+        self.loss_value = 2 * SIZE * min(self._row_scores) - 1.0
+        self._table = {}
+        self._deadline = None
+        self.nodes = 0
+
+    def evaluate(self, state):
+        """Scores a board by summing the weighted heuristics over its rows and columns."""
+        row_scores = self._row_scores
+        t = transpose(state)
+        return (row_scores[state & ROW_MASK] + row_scores[(state >> 16) & ROW_MASK]
+                + row_scores[(state >> 32) & ROW_MASK] + row_scores[(state >> 48) & ROW_MASK]
+                + row_scores[t & ROW_MASK] + row_scores[(t >> 16) & ROW_MASK]
+                + row_scores[(t >> 32) & ROW_MASK] + row_scores[(t >> 48) & ROW_MASK])
+
+    def _max_node(self, state, depth, prob):
+        """Returns the best value over all directions that change the board, or loss_value if none does."""
+        best = None
+        for direction in DIRECTIONS:
+            new_state, _ = move_state(state, direction)
+            if new_state == state:
+                continue
+            value = self._chance_node(new_state, depth - 1, prob)
+            if best is None or value > best:
+                best = value
+        return self.loss_value if best is None else best
+
+    def _chance_node(self, state, depth, prob):
+        """Returns the expected value over every empty cell receiving a 2 or a 4."""
+        self.nodes += 1
+        if self._deadline is not None and self.nodes & 0xFF == 0 and time.monotonic() > self._deadline:
+            raise SearchTimeout()
+
+        # Prune leaves and subtrees too unlikely to matter
+        if depth <= 0 or prob < self.prob_cutoff:
+            return self.evaluate(state)
+
+        cached = self._table.get(state)
+        if cached is not None and cached[0] >= depth:
+            return cached[1]
+
+        empty = empty_cells(state)
+        if not empty:
+            return self.evaluate(state)
+
+        prob /= len(empty)
+        total = 0.0
+        for i in empty:
+            total += 0.9 * self._max_node(state | (1 << (4 * i)), depth, prob * 0.9)
+            total += 0.1 * self._max_node(state | (2 << (4 * i)), depth, prob * 0.1)
+        value = total / len(empty)
+
+        self._table[state] = (depth, value)
+        return value
+
+    def _search_root(self, state, depth):
+        """Returns the expected value of every legal direction at the given depth."""
+        values = {}
+        for direction in DIRECTIONS:
+            new_state, _ = move_state(state, direction)
+            if new_state != state:
+                values[direction] = self._chance_node(new_state, depth - 1, 1.0)
+        return values
+
+    def search(self, state):
+        """
+        Searches a packed board and returns a result dictionary.
+        With a time limit the search deepens one ply at a time up to self.depth and
+        reports the deepest fully completed iteration.
+        """
+        start = time.monotonic()
+        deadline = start + self.time_limit if self.time_limit else None
+        self._table = {}
+        self.nodes = 0
+
+        values = {}
+        completed_depth = 0
+        first_depth = 1 if deadline is not None else self.depth
+        try:
+            for depth in range(first_depth, self.depth + 1):
+                # The first iteration always completes so there is a move to suggest
+                self._deadline = deadline if completed_depth else None
+                values = self._search_root(state, depth)
+                completed_depth = depth
+        except SearchTimeout:
+            pass
+        finally:
+            self._deadline = None
+
+        best = max(values, key=values.get) if values else None
+        return {
+            "direction": best,
+            "expected_value": values[best] if best else None,
+            "values": values,
+            "depth": completed_depth,
+            "nodes": self.nodes,
+            "table_size": len(self._table),
+            "elapsed": time.monotonic() - start
+        }
+
+
+# --- Multiprocess search ---
+# Worker processes each keep their own ExpectimaxSolver, so transposition
+# tables are shared-nothing: a worker only reuses entries from subtrees it
+# searched itself during the same search.
+
+_worker_solver = None
+_worker_search_id = None
+
+
+def _init_worker(weights, prob_cutoff):
+    """Builds the per-process solver and its heuristic tables."""
+    global _worker_solver
+    _worker_solver = ExpectimaxSolver(prob_cutoff=prob_cutoff, weights=weights)
+
+
+def _ping():
+    """Worker task that does nothing; used to start the workers ahead of the first search."""
+    return True
+
+
+def _search_subtree(search_id, state, depth, prob, deadline):
+    """
+    Worker task: evaluates the max node below one root chance outcome.
+    Returns None if the wall-clock deadline passed before the subtree finished.
+    """
+    global _worker_search_id
+    solver = _worker_solver
+    if search_id != _worker_search_id:
+        solver._table = {}
+        _worker_search_id = search_id
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        solver._deadline = time.monotonic() + remaining
+    try:
+        return solver._max_node(state, depth, prob)
+    except SearchTimeout:
+        return None
+    finally:
+        solver._deadline = None
+
+
+class ParallelSolver:
+    """
+    Expectimax search that fans the root directions and their chance outcomes
+    (every tile that can spawn after each direction) out to a process pool.
+    Custom heuristics must be registered at import time to reach the workers.
+    """
+
+    def __init__(self, workers=None, depth=4, time_limit=None, prob_cutoff=0.0001, weights=None):
+        self.depth = depth
+        self.time_limit = time_limit
+        self.prob_cutoff = prob_cutoff
+        # Evaluates leaves that are too shallow to be worth shipping to a worker
+        self._local = ExpectimaxSolver(prob_cutoff=prob_cutoff, weights=weights)
+        self.weights = self._local.weights
+        self._search_count = 0
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.weights, prob_cutoff),
+        )
+        # Start the workers now so the first search does not pay for their startup
+        wait([self._pool.submit(_ping) for _ in range(self.workers)])
+
+    def close(self):
+        """Shuts down the worker processes. Running tasks give up at their search deadline."""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _search_depth(self, state, depth, deadline):
+        """
+        Searches every root direction at one depth.
+        Returns {direction: value}, or None if the deadline cut the iteration short.
+        """
+        self._search_count += 1
+        search_id = (id(self), self._search_count)
+        values = {}
+        tasks = {}
+        for direction in DIRECTIONS:
+            after, _ = move_state(state, direction)
+            if after == state:
+                continue
+            empty = empty_cells(after)
+            if depth <= 1 or not empty:
+                values[direction] = self._local.evaluate(after)
+                continue
+            prob = 1.0 / len(empty)
+            futures = []
+            for i in empty:
+                futures.append((0.9, self._pool.submit(
+                    _search_subtree, search_id, after | (1 << (4 * i)), depth - 1, prob * 0.9, deadline)))
+                futures.append((0.1, self._pool.submit(
+                    _search_subtree, search_id, after | (2 << (4 * i)), depth - 1, prob * 0.1, deadline)))
+            tasks[direction] = (len(empty), futures)
+
+        pending = [future for _, futures in tasks.values() for _, future in futures]
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        _, not_done = wait(pending, timeout=timeout)
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            return None
+
+        for direction, (count, futures) in tasks.items():
+            total = 0.0
+            for weight, future in futures:
+                value = future.result()
+                if value is None:
+                    return None
+                total += weight * value
+            values[direction] = total / count
+        return values
+
+    def search(self, state, depth=None, time_limit=None):
+        """
+        Searches a packed board and returns the same result dictionary as
+        ExpectimaxSolver.search. With a time limit it deepens one ply at a time
+        and reports the deepest iteration that finished before the deadline.
+        depth and time_limit override the solver defaults for this search only.
+        """
+        start = time.monotonic()
+        max_depth = depth or self.depth
+        time_limit = time_limit or self.time_limit
+        deadline = time.time() + time_limit if time_limit else None
+
+        values = {}
+        completed_depth = 0
+        first_depth = 1 if deadline is not None else max_depth
+        for depth in range(first_depth, max_depth + 1):
+            # The first iteration always completes so there is a move to suggest
+            result = self._search_depth(state, depth, deadline if completed_depth else None)
+            if result is None:
+                break
+            values = result
+            completed_depth = depth
+
+        best = max(values, key=values.get) if values else None
+        return {
+            "direction": best,
+            "expected_value": values[best] if best else None,
+            "values": values,
+            "depth": completed_depth,
+            "elapsed": time.monotonic() - start
+        }
+
+
+def board_to_state(board):
+    """Packs a 4x4 board of tile values, rejecting boards the bitboard cannot hold."""
+    if len(board) != SIZE or any(len(row) != SIZE for row in board):
+        raise ValueError(f"Solver only supports {SIZE}x{SIZE} boards")
+    if any(value > 1 << MAX_EXPONENT for row in board for value in row):
+        raise ValueError(f"Solver only supports tiles up to {1 << MAX_EXPONENT}")
+    return encode_board(board)
+
+
+def game_to_state(game):
+    """Returns the packed board of a game, whichever engine it uses."""
+    if isinstance(game, BitboardGame):
+        return game.state
+    return board_to_state(game.board)
+
+
+def suggest(game, depth=3, time_limit=None, prob_cutoff=0.0001, weights=None):
+    """Runs an expectimax search from a game's current board and returns the best direction."""
+    if game.game_over:
+        raise ValueError("Game is over")
+    solver = ExpectimaxSolver(depth=depth, time_limit=time_limit,
+                              prob_cutoff=prob_cutoff, weights=weights)
+    return solver.search(game_to_state(game))
+
+
+# Regression check (for testing): sliding right here leaves a dead board whatever
+# tile spawns, while left survives, so every search must pick left
+if __name__ == "__main__":
+    state = encode_board([[4, 4, 16, 2], [16, 32, 128, 4], [4, 8, 16, 8], [8, 16, 4, 2]])
+    result = ExpectimaxSolver(depth=3).search(state)
+    print(f"ExpectimaxSolver: {result['values']}")
+    assert result["direction"] == "left", result
+    parallel = ParallelSolver(workers=2, depth=3)
+    try:
+        result = parallel.search(state)
+    finally:
+        parallel.close()
+    print(f"ParallelSolver: {result['values']}")
+    assert result["direction"] == "left", result
@@ -0,0 +1,65 @@
+"""
+Compact board representations for API responses and MCP tool results.
+
+exponent_string packs a board into one character per cell, row-major: the
+tile's exponent in base 36 ('0' for empty, '1' for 2, 'b' for 2048), so a
+4x4 board becomes 16 characters like "0001002000b00000". decode_board
+reverses it given the size.
+
+terse_board writes the tile values row by row, e.g. "2 0 0 4/0 8 2 0/...",
+which is short but still easy to read for language-model agents.
+"""
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+EXPONENTS = {digit: exponent for exponent, digit in enumerate(DIGITS)}
+
+# Content type of responses whose boards are exponent strings
+COMPACT_MIMETYPE = "application/vnd.2048.compact+json"
+
+
+def exponent_string(board):
+    """Packs a list-of-lists board into one base-36 exponent digit per cell."""
+    return "".join(DIGITS[value.bit_length() - 1] if value else "0" for row in board for value in row)
+
+
+def decode_board(cells, size):
+    """Unpacks an exponent string into a list-of-lists board of tile values."""
+    if len(cells) != size * size:
+        raise ValueError(f"Expected {size * size} cells, got {len(cells)}")
+    values = [1 << EXPONENTS[digit] if digit != "0" else 0 for digit in cells]
+    return [values[r * size:(r + 1) * size] for r in range(size)]
+
+
+def terse_board(board):
+    """Writes a board as its rows of tile values, cells separated by spaces and rows by '/'."""
+    return "/".join(" ".join(map(str, row)) for row in board)
+
+
+def _is_board(value):
+    return isinstance(value, (list, tuple)) and all(isinstance(row, (list, tuple)) for row in value)
+
+
+def transform_boards(body, encode):
+    """
+    Returns a copy of a response body in which every "board" value is replaced by encode(board).
+    Boards with tiles beyond the base-36 range are left as lists.
+    """
+    if isinstance(body, dict):
+        result = {}
+        for key, value in body.items():
+            if key == "board" and _is_board(value):
+                try:
+                    result[key] = encode(value)
+                except IndexError:
+                    result[key] = value
+            else:
+                result[key] = transform_boards(value, encode)
+        return result
+    if isinstance(body, (list, tuple)):
+        return [transform_boards(value, encode) for value in body]
+    return body
+
+
+def compact_body(body):
+    """The response body with every board as an exponent string."""
+    return transform_boards(body, exponent_string)